@@ -0,0 +1,162 @@
+"""Batch resolution of NDC, RxCUI and UNII codes against the NDC dataset.
+
+Identifiers are normalized, packed into as few `OR` queries as the query
+length budget allows, and the queries run with bounded concurrency. Results
+are yielded per input identifier as each query finishes.
+"""
+import asyncio
+import re
+from urllib.parse import quote_plus
+
+from fastapi import HTTPException
+
+import registry
+
+# Hyphenated layouts openFDA stores, and the zero-padded 11/9-digit (5-4-2 / 5-4) billing forms.
+PACKAGE_LAYOUTS = [(4, 4, 2), (5, 3, 2), (5, 4, 1)]
+PRODUCT_LAYOUTS = [(4, 4), (5, 3), (5, 4)]
+PADDED = {"package_ndc": (5, 4, 2), "product_ndc": (5, 4)}
+LAYOUTS = {"package_ndc": PACKAGE_LAYOUTS, "product_ndc": PRODUCT_LAYOUTS}
+
+FIELDS = {"package_ndc": "packaging.package_ndc", "product_ndc": "product_ndc", "rxcui": "openfda.rxcui", "unii": "openfda.unii"}
+# Most terms per query: an NDC form matches at most one product, an RxCUI or UNII can match many.
+GROUP_TERMS = {"package_ndc": 99, "product_ndc": 99, "rxcui": 5, "unii": 5}
+UNII = re.compile(r"^[A-Z0-9]{10}$")
+
+
+def split_digits(digits, layout):
+    parts, i = [], 0
+    for n in layout:
+        parts.append(digits[i:i + n])
+        i += n
+    return parts
+
+
+def ndc_forms(value, kind):
+    """Every hyphenated openFDA form an NDC in any common notation can stand for."""
+    layouts, padded = LAYOUTS[kind], PADDED[kind]
+    parts = value.strip().split("-")
+    if not all(p.isdigit() for p in parts):
+        raise ValueError(f"not an NDC: {value!r}")
+    if len(parts) == 1:
+        digits = parts[0]
+        if len(digits) == sum(padded) - 1:
+            return ["-".join(split_digits(digits, layout)) for layout in layouts if sum(layout) == len(digits)]
+        if len(digits) != sum(padded):
+            raise ValueError(f"unexpected NDC length: {value!r}")
+        parts = split_digits(digits, padded)
+    if len(parts) != len(padded):
+        raise ValueError(f"unexpected NDC segments: {value!r}")
+    lens = tuple(map(len, parts))
+    forms = ["-".join(parts)] if lens in layouts else []
+    if lens == padded:
+        # Padded form: one segment carries an extra leading zero.
+        for layout in layouts:
+            for i, (have, want) in enumerate(zip(padded, layout)):
+                if have != want and parts[i].startswith("0"):
+                    forms.append("-".join(parts[:i] + [parts[i][1:]] + parts[i + 1:]))
+    if not forms:
+        raise ValueError(f"unexpected NDC segments: {value!r}")
+    return list(dict.fromkeys(forms))
+
+
+def detect(value):
+    value = value.strip()
+    segments = value.count("-")
+    digits = value.replace("-", "")
+    if segments == 2 or (not segments and digits.isdigit() and len(digits) in (10, 11)):
+        return "package_ndc"
+    if segments == 1 or (digits.isdigit() and len(digits) in (8, 9)):
+        return "product_ndc"
+    if UNII.match(value.upper()) and not value.isdigit():
+        return "unii"
+    if value.isdigit() and len(value) <= 7:
+        return "rxcui"
+    raise ValueError(f"unrecognized identifier: {value!r}")
+
+
+def normalize(value, kind=None):
+    """(kind, query terms) for one identifier; raises ValueError if it cannot be read."""
+    kind = kind or detect(value)
+    if kind in LAYOUTS:
+        return kind, ndc_forms(value, kind)
+    if kind == "unii":
+        return kind, [value.strip().upper()]
+    if kind == "rxcui" and value.strip().isdigit():
+        return kind, [value.strip()]
+    raise ValueError(f"not a valid {kind}: {value!r}")
+
+
+def build_query(field, terms):
+    return registry.combine([registry.clause(field, t) for t in terms], "OR")
+
+
+def plan_groups(items, max_chars):
+    """Pack (input, kind, terms) items into per-kind groups within term and URL-length budgets."""
+    groups = []
+    for kind, field in FIELDS.items():
+        current, terms = [], []
+        for item in (i for i in items if i[1] == kind):
+            candidate = terms + item[2]
+            if current and (len(candidate) > GROUP_TERMS[kind] or len(quote_plus(build_query(field, candidate))) > max_chars):
+                groups.append((kind, current, terms))
+                current, candidate = [], item[2]
+            current.append(item)
+            terms = candidate
+        if current:
+            groups.append((kind, current, terms))
+    return groups
+
+
+def split_terms(field, terms, max_chars):
+    """Split terms into the fewest `OR` queries on field whose URL-encoded form fits max_chars."""
+    chunks, current = [], []
+    for term in terms:
+        if current and len(quote_plus(build_query(field, current + [term]))) > max_chars:
+            chunks.append(current)
+            current = []
+        current.append(term)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def matched_terms(kind, record):
+    if kind == "package_ndc":
+        return [p.get("package_ndc") for p in record.get("packaging", [])]
+    if kind == "product_ndc":
+        return [record.get("product_ndc")]
+    return [str(v).upper() for v in record.get("openfda", {}).get(kind, [])]
+
+
+async def resolve(search, url, items, concurrency, max_chars, limit=99):
+    """Yield one result dict per input identifier, in completion order."""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(kind, members, terms):
+        async with slots:
+            try:
+                data = await search(url, build_query(FIELDS[kind], terms), limit)
+            except HTTPException as e:
+                return [{"input": raw, "type": kind, "error": e.detail, "status": e.status_code} for raw, _, _ in members]
+        results = data.get("results", [])
+        truncated = data.get("meta", {}).get("results", {}).get("total", 0) > len(results)
+        by_term = {}
+        for raw, _, item_terms in members:
+            for term in item_terms:
+                by_term.setdefault(term.upper(), []).append(raw)
+        found = {raw: [] for raw, _, _ in members}
+        for record in results:
+            for raw in dict.fromkeys(r for term in matched_terms(kind, record) if term for r in by_term.get(term.upper(), [])):
+                found[raw].append(record)
+        return [{"input": raw, "type": kind, "query_forms": item_terms, "results": found[raw], "truncated": truncated}
+                for raw, _, item_terms in members]
+
+    tasks = [asyncio.create_task(run(*group)) for group in plan_groups(items, max_chars)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            for line in await task:
+                yield line
+    finally:
+        for task in tasks:
+            task.cancel()
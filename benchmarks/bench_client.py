@@ -0,0 +1,57 @@
+"""Per-call AsyncClient vs the shared pooled client in main.search_endpoint.
+
+    python -m benchmarks.bench_client --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from benchmarks.fake_openfda import FakeOpenFDA
+
+
+async def per_call_search(url, search_query, limit=10):
+    # The pre-pooling implementation: a fresh client (and connection) per call.
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        response = await client.get(url, params={"search": search_query, "limit": min(limit, 99)})
+        response.raise_for_status()
+        return response.json()
+
+
+async def drive(search, url, total, concurrency):
+    queue = iter(range(total))
+
+    async def worker():
+        for i in queue:
+            await search(url, f"openfda.brand_name:drug{i % 200}", 10)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    async with FakeOpenFDA(latency=args.latency) as upstream:
+        os.environ["OPENFDA_BASE_URL"] = upstream.base_url
+        # Compare connection handling only, without openFDA's quota pacing.
+        os.environ.update(OPENFDA_RATE_PER_MINUTE="1000000000", OPENFDA_RATE_PER_DAY="0")
+        import main as app_module
+        url = f"{upstream.base_url}/drug/label.json"
+        for name, search in (("per-call client", per_call_search), ("shared client", app_module.fetch_upstream)):
+            upstream.reset_counters()
+            elapsed = await drive(search, url, args.requests, args.concurrency)
+            print(f"{name:16s} {args.requests / elapsed:9.1f} req/s  {upstream.connections:6d} handshakes  {upstream.requests:6d} requests")
+        await app_module.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial upstream latency in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""Ranked label search: build rate, index size and query latency of label_text.
+
+    python -m benchmarks.bench_label_text --labels 5000 --queries 120
+
+Labels get Zipf-distributed words from a synthetic vocabulary, so term
+frequencies look like real SPL text, with the clinical phrases of fixtures.py
+mixed in at a low rate. The synthetic labels of fixtures.py alone repeat the
+same seven phrases in every section, which no real corpus does. Queries of
+common vocabulary words match most sections, the worst case for ranking.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import PHRASES, records
+from label_text import LabelTextIndex
+
+SECTIONS = ["indications_and_usage", "contraindications", "warnings", "boxed_warning", "adverse_reactions", "drug_interactions",
+            "clinical_pharmacology", "dosage_and_administration", "overdosage", "description", "how_supplied", "precautions"]
+QUERIES = ["QT prolongation with macrolides", "serious liver injury", "gastrointestinal bleeding risk", "renal impairment dose",
+           "monitor INR", "rash discontinue"]
+
+
+def vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 11))) for _ in range(size)]
+
+
+def label(doc, rng, words, cum_weights, section_words, phrase_rate):
+    for name in rng.sample(SECTIONS, rng.randint(5, len(SECTIONS))):
+        text = rng.choices(words, cum_weights=cum_weights, k=section_words)
+        for i in range(0, len(text), 50):
+            if rng.random() < phrase_rate:
+                text[i] = rng.choice(PHRASES)
+        doc[name] = [" ".join(text)]
+    return doc
+
+
+def main(args):
+    rng = random.Random(0)
+    words = vocabulary(args.vocabulary, rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    path = args.db or os.path.join(tempfile.mkdtemp(), "label_text.db")
+    index = LabelTextIndex(path, candidates=args.candidates)
+    if index.stats()["labels"] < args.labels:
+        docs = (label(d, rng, words, cum_weights, args.section_words, args.phrase_rate) for d in records("label", args.labels))
+        started = time.perf_counter()
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) == 1000:
+                index.add(batch)
+                batch = []
+        index.add(batch)
+        build = time.perf_counter() - started
+        print(f"built {args.labels} labels in {build:.1f}s ({args.labels / build:.0f} labels/s)")
+    size = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+    print(f"{index.stats()['labels']} labels, {size / 2 ** 20:.1f} MiB")
+
+    started = time.perf_counter()
+    index.add(list(records("label", min(args.labels, 1000))))
+    print(f"re-adding 1000 known label versions: {(time.perf_counter() - started) * 1e3:.1f} ms")
+
+    queries = QUERIES + [f"{words[0]} {words[2]}", f"{words[1]} {words[300]} {words[20000]}"]
+    timings = {q: [] for q in queries}
+    for i in range(args.queries):
+        query = queries[i % len(queries)]
+        started = time.perf_counter()
+        index.search(query, args.limit)
+        timings[query].append(time.perf_counter() - started)
+    for query, values in timings.items():
+        values.sort()
+        p95 = values[int(len(values) * 0.95) - 1] if len(values) > 1 else values[0]
+        meta = index.search(query, args.limit)["meta"]
+        print(f"{query:36s} p50 {statistics.median(values) * 1e3:7.2f} ms  p95 {p95 * 1e3:7.2f} ms  "
+              f"{meta['results']['total']:6d} labels{'' if meta['exhaustive'] else ' (bounded)'}")
+    index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--labels", type=int, default=5000)
+    parser.add_argument("--vocabulary", type=int, default=30000)
+    parser.add_argument("--section-words", type=int, default=300)
+    parser.add_argument("--phrase-rate", type=float, default=0.02, help="chance that each 50-word stretch holds a clinical phrase")
+    parser.add_argument("--queries", type=int, default=120)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=2000, help="sections scored per match tier")
+    parser.add_argument("--db", default=None, help="keep the index in this file; an existing one with enough labels is reused")
+    main(parser.parse_args())
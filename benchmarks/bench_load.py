@@ -0,0 +1,249 @@
+"""Load test of the app under uvicorn (several workers) against the fake openFDA.
+
+    python -m benchmarks.bench_load --workers 4 --concurrency 64 --duration 30
+    python -m benchmarks.bench_load --mix single=1 --latency 0.1 --json results.json
+
+Starts the fake upstream and `uvicorn main:app` as subprocesses, then drives
+a weighted mix of workloads: single-field lookups, search/all fan-outs (and
+drug profiles), and large label payloads. Reports throughput and
+p50/p95/p99 latency per workload, plus the resident memory summed over the
+uvicorn processes (peak and at the end of the run, read from /proc).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from benchmarks import fake_openfda
+from benchmarks.fixtures import BRANDS, GENERICS, MANUFACTURERS, PHRASES
+
+UPSTREAM_OPTIONS = ["latency", "jitter", "error_rate", "throttle_rate", "not_found_rate", "rate_limit", "window", "retry_after",
+                    "pool", "section_kb", "fixtures", "seed"]
+LABEL_SECTIONS = ["warnings", "adverse-reactions", "drug-interactions", "indications-and-usage"]
+
+
+def product_ndc(rng):
+    i = rng.randrange(1000)
+    return f"{i % 90000 + 10000:05d}-{i % 1000:03d}"
+
+
+WORKLOADS = {
+    "single": [
+        lambda rng: ("/api/ndc/brand-name", {"name": rng.choice(BRANDS)}),
+        lambda rng: ("/api/ndc/generic-name", {"name": rng.choice(GENERICS)}),
+        lambda rng: ("/api/ndc/product-ndc", {"ndc": product_ndc(rng)}),
+        lambda rng: ("/api/ndc/manufacturer", {"name": rng.choice(MANUFACTURERS)}),
+        lambda rng: ("/api/label/brand-name", {"name": rng.choice(BRANDS)}),
+        lambda rng: ("/api/drugsfda/search", {"query": rng.choice(BRANDS)}),
+    ],
+    "fanout": [
+        lambda rng: ("/api/ndc/search/all", {"query": rng.choice(BRANDS + GENERICS)}),
+        lambda rng: ("/api/drugsfda/search/all", {"query": rng.choice(BRANDS + GENERICS)}),
+        lambda rng: ("/api/label/search/all", {"query": rng.choice(GENERICS)}),
+        lambda rng: (f"/api/drug/{product_ndc(rng)}", {}),
+    ],
+    "label": [
+        lambda rng: (f"/api/label/{rng.choice(LABEL_SECTIONS)}", {"query": rng.choice(PHRASES), "limit": 20, "fields": "*"}),
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid):
+    """`pid` and its descendants, from /proc (Linux only; empty elsewhere)."""
+    children = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree if children else []
+
+
+def rss_bytes(pids):
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                total += next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            continue
+    return total
+
+
+def percentiles(latencies):
+    if len(latencies) < 2:
+        value = latencies[0] * 1e3 if latencies else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49] * 1e3, cuts[94] * 1e3, cuts[98] * 1e3
+
+
+def summarize(samples, elapsed):
+    latencies = [t for t, _ in samples]
+    errors = {}
+    for _, status in samples:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    p50, p95, p99 = percentiles(latencies)
+    return {"requests": len(samples), "errors": errors, "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1)}
+
+
+def start(cmd, env, log):
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(url, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{proc.args[3]} exited with {proc.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+async def drive(base_url, mix, args, pids):
+    names, weights = zip(*mix.items())
+    rng = random.Random(args.seed)
+    samples = {name: [] for name in names}
+    rss = {"peak": 0, "end": 0}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+
+        async def worker(stop_at, record):
+            while time.monotonic() < stop_at:
+                name = rng.choices(names, weights)[0]
+                path, params = rng.choice(WORKLOADS[name])(rng)
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, params=params)
+                    await response.aread()
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if record:
+                    samples[name].append((time.perf_counter() - started, status))
+
+        async def sample_rss():
+            while True:
+                rss["end"] = rss_bytes(pids)
+                rss["peak"] = max(rss["peak"], rss["end"])
+                await asyncio.sleep(0.5)
+
+        if args.warmup:
+            stop_at = time.monotonic() + args.warmup
+            await asyncio.gather(*(worker(stop_at, False) for _ in range(args.concurrency)))
+        sampler = asyncio.create_task(sample_rss())
+        started = time.perf_counter()
+        stop_at = time.monotonic() + args.duration
+        await asyncio.gather(*(worker(stop_at, True) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+    rss["end"] = rss_bytes(pids) or rss["end"]
+    return samples, elapsed, rss
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in WORKLOADS:
+            raise argparse.ArgumentTypeError(f"unknown workload {name!r}; choose from {', '.join(WORKLOADS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def report(result):
+    config = result["config"]
+    print(f"workers {config['workers']}  concurrency {config['concurrency']}  duration {config['duration']}s  "
+          f"upstream latency {config['latency'] * 1e3:.0f} ms  cache {'on' if config['cache'] else 'off'}")
+    print(f"{'workload':10s} {'requests':>9s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}  errors")
+    for name, row in [*result["workloads"].items(), ("total", result["total"])]:
+        print(f"{name:10s} {row['requests']:9d} {row['rps']:8.1f} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} {row['p99_ms']:8.1f}  {row['errors'] or ''}")
+    rss = result["rss_mb"]
+    print(f"RSS (all uvicorn processes): peak {rss['peak']:.1f} MiB, end {rss['end']:.1f} MiB" if rss["peak"] else "RSS: n/a (no /proc)")
+
+
+async def main(args):
+    upstream_port, app_port = free_port(), free_port()
+    env = {**os.environ, "PYTHONPATH": ROOT, "OPENFDA_BASE_URL": f"http://127.0.0.1:{upstream_port}",
+           # The benchmark measures the app, not openFDA's quota.
+           "OPENFDA_RATE_PER_MINUTE": "1000000000", "OPENFDA_RATE_PER_DAY": "0",
+           "CACHE_ENABLED": "1" if args.cache else "0", "DATA_BACKEND": "openfda"}
+    upstream_cmd = [sys.executable, "-m", "benchmarks.fake_openfda", "--port", str(upstream_port)]
+    for name in UPSTREAM_OPTIONS:
+        if getattr(args, name) is not None:
+            upstream_cmd += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    app_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--workers", str(args.workers),
+               "--no-access-log", "--log-level", "warning"]
+    with open(args.log, "w") as log:
+        upstream = start(upstream_cmd, env, log)
+        app = start(app_cmd, env, log)
+        try:
+            await wait_ready(f"http://127.0.0.1:{upstream_port}/", upstream)
+            await wait_ready(f"http://127.0.0.1:{app_port}/api/scheduler/stats", app)
+            pids = process_tree(app.pid)
+            samples, elapsed, rss = await drive(f"http://127.0.0.1:{app_port}", args.mix, args, pids)
+        finally:
+            for proc in (app, upstream):
+                proc.terminate()
+                try:
+                    proc.wait(10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+    result = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "log")},
+        "workloads": {name: summarize(rows, elapsed) for name, rows in samples.items()},
+        "total": summarize([row for rows in samples.values() for row in rows], elapsed),
+        "rss_mb": {k: round(v / 2 ** 20, 1) for k, v in rss.items()},
+    }
+    report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured load first")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("single=6,fanout=3,label=1"),
+                        help="workload weights, e.g. single=6,fanout=3,label=1")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on (off measures every upstream call)")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--log", default=os.devnull, help="file for the app and upstream output")
+    fake_openfda.add_arguments(parser)
+    parser.set_defaults(section_kb=4, latency=0.02)
+    asyncio.run(main(parser.parse_args()))
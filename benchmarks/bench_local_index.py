@@ -0,0 +1,71 @@
+"""Ingest synthetic bulk files and time local-index lookups and keyset-paged exports.
+
+    python -m benchmarks.bench_local_index --records 50000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import records, write_bulk
+from local_index import LocalIndex, ingest
+
+QUERIES = [
+    ("ndc", "product_ndc:10042-042"),
+    ("ndc", "packaging.package_ndc:10042-042-01"),
+    ("ndc", "openfda.rxcui:100042"),
+    ("label", "set_id:0000002a-0000-4000-8000-000000000000"),
+    ("ndc", "brand_name:advil"),
+    ("label", "openfda.generic_name:warfarin"),
+    ("label", "drug_interactions:\"macrolide antibiotics\""),
+    ("label", "_exists_:boxed_warning"),
+]
+# Whole-result-set exports, paged by doc id.
+EXPORTS = [
+    ("ndc", "brand_name:advil"),
+    ("label", "drug_interactions:\"macrolide antibiotics\""),
+    ("label", "_exists_:boxed_warning"),
+    ("label", "_exists_:boxed_warning AND openfda.generic_name:warfarin"),
+]
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for dataset in ("ndc", "label", "drugsfda"):
+            path = os.path.join(tmp, f"drug-{dataset}-0001-of-0001.json.zip")
+            write_bulk(path, dataset, records(dataset, args.records))
+            files.append(path)
+        db = os.path.join(tmp, "drug_index.db")
+        ingest(db, files)
+        print(f"index size {os.path.getsize(db) / 1e6:.1f} MB")
+        index = LocalIndex(db)
+        for dataset, query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                data = index.search(dataset, query, 10)
+                timings.append(time.perf_counter() - start)
+            print(f"{dataset:6s} {query:55s} {len(data['results']):3d}/{data['meta']['results']['total']:<7d} median {statistics.median(timings) * 1e3:8.3f} ms")
+        for dataset, query in EXPORTS:
+            start, after, rows, pages = time.perf_counter(), 0, 0, 0
+            while True:
+                page, after = index.search_after(dataset, query, args.page_size, after)
+                if not page:
+                    break
+                rows, pages = rows + len(page), pages + 1
+            elapsed = time.perf_counter() - start
+            print(f"export {dataset:6s} {query:48s} {rows:7d} rows in {pages:4d} pages {elapsed:7.2f} s  {rows / elapsed:8.0f} rows/s")
+        index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=1000)
+    main(parser.parse_args())
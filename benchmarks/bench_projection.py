@@ -0,0 +1,51 @@
+"""Label response size and encoding time: full documents vs projected + orjson.
+
+    python -m benchmarks.bench_projection --limit 10 --section-kb 40
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+import projection
+from benchmarks.fixtures import pad_sections, records
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    return body, statistics.median(timings)
+
+
+def main(args):
+    rng = random.Random(0)
+    data = {"meta": {"results": {"skip": 0, "limit": args.limit, "total": args.limit}},
+            "results": [pad_sections(d, rng, args.section_kb) for d in records("label", args.limit)]}
+    cases = [
+        ("full, jsonable_encoder + json", lambda: json.dumps(jsonable_encoder(data)).encode()),
+        ("full, orjson", lambda: projection.FastJSONResponse(data).body),
+        ("drug-interactions default", lambda: projection.FastJSONResponse(projection.project(data, projection.default_fields(["drug_interactions"]))).body),
+        ("UI fields, max_chars=200", lambda: projection.FastJSONResponse(projection.project(
+            data, projection.LABEL_IDENTIFIERS + projection.LABEL_SUMMARY, 200, "macrolide")).body),
+    ]
+    for name, fn in cases:
+        body, elapsed = timed(fn, args.repeat)
+        print(f"{name:32s} {len(body) / 1024:10.1f} KiB  {elapsed * 1e3:8.2f} ms per response")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--section-kb", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
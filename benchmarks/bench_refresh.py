@@ -0,0 +1,71 @@
+"""Full re-ingest vs incremental refresh on a synthetic partitioned dataset.
+
+    python -m benchmarks.bench_refresh --records 1000000 --partitions 10 --changed-partitions 2
+
+Each step runs `python -m local_index` in a child process so its peak RSS can
+be read back with wait4().
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fixtures import records, write_bulk
+
+
+def run(*args):
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "local_index", *args], cwd=ROOT, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    if status:
+        raise SystemExit(f"local_index {args[0]} failed with status {status}")
+    # ru_maxrss is KiB on Linux.
+    return time.perf_counter() - start, usage.ru_maxrss / 1024
+
+
+def partition(dataset, path, start, n, changed, delta):
+    docs = records(dataset, n, start)
+    if changed:
+        def mutate(docs):
+            for i, doc in enumerate(docs):
+                if i % 1000 < delta * 1000:  # drop
+                    continue
+                if i % 1000 < 2 * delta * 1000:  # update
+                    doc["marketing_category"] = "NDA"
+                yield doc
+            yield from records(dataset, int(n * delta), start + 10 ** 8)  # insert
+        docs = mutate(docs)
+    write_bulk(path, dataset, docs)
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(dir=args.tmp) as tmp:
+        per = args.records // args.partitions
+        paths = [os.path.join(tmp, f"drug-{args.dataset}-{i + 1:04d}-of-{args.partitions:04d}.json.zip") for i in range(args.partitions)]
+        for i, path in enumerate(paths):
+            partition(args.dataset, path, i * per, per, False, 0)
+        db = os.path.join(tmp, "drug_index.db")
+        elapsed, rss = run("ingest", "--db", db, *paths)
+        print(f"full ingest      {elapsed:8.1f} s  peak RSS {rss:8.1f} MiB  db {os.path.getsize(db) / 2 ** 20:.0f} MiB")
+        for i in range(args.changed_partitions):
+            partition(args.dataset, paths[i], i * per, per, True, args.delta)
+        elapsed, rss = run("refresh", "--db", db, *paths)
+        print(f"refresh          {elapsed:8.1f} s  peak RSS {rss:8.1f} MiB  ({args.changed_partitions}/{args.partitions} partitions changed, {args.delta:.1%} each of drop/update/insert)")
+        elapsed, rss = run("ingest", "--db", db, *paths)
+        print(f"full re-ingest   {elapsed:8.1f} s  peak RSS {rss:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--partitions", type=int, default=10)
+    parser.add_argument("--changed-partitions", type=int, default=2)
+    parser.add_argument("--delta", type=float, default=0.01)
+    parser.add_argument("--dataset", default="ndc", choices=["ndc", "label", "drugsfda"])
+    parser.add_argument("--tmp", default=None, help="directory for the fixture files (needs several GB at 1M records)")
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+"""Burst traffic against a fake openFDA that enforces a rate limit with 429s.
+
+    python -m benchmarks.bench_scheduler --requests 300 --upstream-limit 50 --window 1
+
+Compares the bare client with the scheduler: how many 429s reach callers,
+how many upstream calls were throttled, and how long interactive requests
+wait while a batch job is queued in front of them.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+
+from benchmarks.fake_openfda import FakeOpenFDA
+
+
+async def timed(call):
+    start = time.perf_counter()
+    try:
+        await call()
+        return time.perf_counter() - start, None
+    except HTTPException as e:
+        return time.perf_counter() - start, e.status_code
+
+
+def report(name, results, upstream):
+    failures = [s for _, s in results if s]
+    latencies = sorted(t for t, _ in results)
+    print(f"{name:28s} ok {len(results) - len(failures):5d}  failed {len(failures):4d} {sorted(set(failures))}  "
+          f"upstream 429s {upstream.throttled:4d}  p50 {statistics.median(latencies) * 1e3:8.1f} ms  max {latencies[-1] * 1e3:8.1f} ms")
+
+
+async def main(args):
+    os.environ["CACHE_ENABLED"] = "0"
+    async with FakeOpenFDA(rate_limit=args.upstream_limit, window=args.window, retry_after=args.window) as upstream:
+        os.environ["OPENFDA_BASE_URL"] = upstream.base_url
+        import main as app_module
+        import scheduler
+
+        url = app_module.LABEL_URL
+        search = lambda i: (lambda: app_module.fetch_upstream(url, f"set_id:{i}", 1))
+
+        app_module.upstream_scheduler = scheduler.Scheduler(limits=[(10 ** 9, 1)], retries=0)
+        results = await asyncio.gather(*(timed(search(i)) for i in range(args.requests)))
+        report("no quota, no retries", results, upstream)
+
+        await asyncio.sleep(args.window)
+        upstream.reset_counters()
+        app_module.upstream_scheduler = scheduler.Scheduler(limits=[(args.upstream_limit, args.window)], retries=5, backoff_base=0.05)
+        scheduler.request_priority.set(scheduler.BATCH)
+        batch_job = [asyncio.create_task(timed(search(i))) for i in range(args.requests)]
+        await asyncio.sleep(0)
+        scheduler.request_priority.set(scheduler.INTERACTIVE)
+        interactive = await asyncio.gather(*(timed(search(-i)) for i in range(1, args.interactive + 1)))
+        batch_results = await asyncio.gather(*batch_job)
+        report("scheduler: batch", batch_results, upstream)
+        report("scheduler: interactive", interactive, upstream)
+        print(app_module.upstream_scheduler.stats())
+        await app_module.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--upstream-limit", type=int, default=50, help="requests the fake upstream allows per window")
+    parser.add_argument("--window", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
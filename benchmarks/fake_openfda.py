@@ -0,0 +1,213 @@
+"""Minimal local stand-in for api.fda.gov used by the benchmarks.
+
+Speaks just enough HTTP/1.1 (keep-alive, Content-Length) to be driven by httpx
+and counts accepted TCP connections, which is the number of handshakes a real
+upstream would have seen. With `rate_limit` set it answers 429 + Retry-After
+once more than that many requests arrive within `window` seconds, like openFDA.
+
+`/drug/{drugsfda,ndc,label}.json` are answered from a fixture pool: the
+synthetic records of benchmarks/fixtures.py, or recorded openFDA responses
+(`{dataset}.json` files in `fixtures_dir`). The page served for a query is
+picked by a checksum of the query, so the same request always gets the same
+answer, in every process. Latency jitter, 5xx errors, random 429s and
+not-found (404) answers are injected from a seeded RNG.
+
+Run standalone for load tests against a multi-worker app:
+
+    python -m benchmarks.fake_openfda --port 8899 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import pad_sections, records
+from local_index import values_at
+
+NOT_FOUND = b'{"error": {"code": "NOT_FOUND", "message": "No matches found!"}}'
+
+
+class FakeOpenFDA:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, rate_limit=None, window=1.0, retry_after=1,
+                 jitter=0.0, error_rate=0.0, throttle_rate=0.0, not_found_rate=0.0, pool=1000, section_kb=0,
+                 fixtures_dir=None, seed=0):
+        self.host, self.port, self.latency = host, port, latency
+        self.rate_limit, self.window, self.retry_after = rate_limit, window, retry_after
+        self.jitter, self.error_rate, self.throttle_rate, self.not_found_rate = jitter, error_rate, throttle_rate, not_found_rate
+        self.pool, self.section_kb, self.fixtures_dir = pool, section_kb, fixtures_dir
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.connections = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self._recent = collections.deque()
+        self._server = None
+        self._handlers = set()
+        self._records = {}
+        self._bodies = {}
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def reset_counters(self):
+        self.connections = self.requests = self.throttled = self.errors = 0
+
+    def over_limit(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > self.window:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate_limit:
+            return True
+        self._recent.append(now)
+        return False
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        # Close idle keep-alive connections so their handlers see EOF and return.
+        for task, writer in list(self._handlers):
+            writer.close()
+        await asyncio.gather(*(task for task, _ in self._handlers), return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def records(self, dataset):
+        if dataset not in self._records:
+            path = os.path.join(self.fixtures_dir, f"{dataset}.json") if self.fixtures_dir else None
+            if path and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    docs = json.load(f)["results"]
+            else:
+                docs = list(records(dataset, self.pool, seed=self.seed))
+            if dataset == "label" and self.section_kb:
+                rng = random.Random(self.seed)
+                docs = [pad_sections(doc, rng, self.section_kb) for doc in docs]
+            self._records[dataset] = docs
+        return self._records[dataset]
+
+    def count(self, dataset, field, limit):
+        counts = collections.Counter(v for doc in self.records(dataset) for v in values_at(doc, field.removesuffix(".exact")))
+        results = [{"term": term, "count": n} for term, n in counts.most_common(limit)]
+        return json.dumps({"meta": {"results": {"total": len(results)}}, "results": results}).encode()
+
+    def respond(self, method, target, headers):
+        """(status, headers, body) for one request; the same target always gets the same answer."""
+        url = urlsplit(target)
+        dataset = url.path.rsplit("/", 1)[-1].split(".", 1)[0]
+        if dataset not in ("drugsfda", "ndc", "label"):
+            return 404, {"Content-Type": "application/json"}, NOT_FOUND
+        body = self._bodies.get(target)
+        if body is None:
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            checksum = zlib.crc32(params.get("search", "").encode())
+            if "count" in params:
+                body = self.count(dataset, params["count"], int(params.get("limit", 100)))
+            elif checksum % 10000 < self.not_found_rate * 10000:
+                body = NOT_FOUND
+            else:
+                docs = self.records(dataset)
+                limit, skip = min(int(params.get("limit", 1)), 1000), int(params.get("skip", 0))
+                total = checksum % len(docs) + 1
+                page = [docs[(checksum + i) % len(docs)] for i in range(skip, min(skip + limit, total))]
+                body = json.dumps({"meta": {"results": {"skip": skip, "limit": limit, "total": total}}, "results": page}).encode()
+            if len(self._bodies) >= 10000:
+                self._bodies.clear()
+            self._bodies[target] = body
+        return (404 if body is NOT_FOUND else 200), {"Content-Type": "application/json"}, body
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        handler = (asyncio.current_task(), writer)
+        self._handlers.add(handler)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = line.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                if headers.get("content-length"):
+                    await reader.readexactly(int(headers["content-length"]))
+                self.requests += 1
+                if self.latency or self.jitter:
+                    await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+                if self.over_limit() or (self.throttle_rate and self.rng.random() < self.throttle_rate):
+                    self.throttled += 1
+                    status, out_headers, body = 429, {"Retry-After": str(self.retry_after)}, b'{"error": {"code": "OVER_RATE_LIMIT"}}'
+                elif self.error_rate and self.rng.random() < self.error_rate:
+                    self.errors += 1
+                    status, out_headers, body = self.rng.choice((500, 502, 503)), {}, b'{"error": {"code": "SERVER_ERROR"}}'
+                else:
+                    status, out_headers, body = self.respond(method, target, headers)
+                head = [f"HTTP/1.1 {status} {'OK' if status < 400 else 'ERROR'}", f"Content-Length: {len(body)}"]
+                head += [f"{k}: {v}" for k, v in out_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+
+
+async def serve(args):
+    upstream = FakeOpenFDA(args.host, args.port, args.latency, args.rate_limit, args.window, args.retry_after, args.jitter,
+                           args.error_rate, args.throttle_rate, args.not_found_rate, args.pool, args.section_kb, args.fixtures, args.seed)
+    async with upstream:
+        print(f"fake openFDA on {upstream.base_url}", flush=True)
+        await asyncio.Event().wait()
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500/502/503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="share of queries answered 404 (no matches)")
+    parser.add_argument("--rate-limit", type=int, default=None, help="429 once this many requests arrive within --window")
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--pool", type=int, default=1000, help="synthetic records per dataset")
+    parser.add_argument("--section-kb", type=int, default=0, help="pad label sections to about this size")
+    parser.add_argument("--fixtures", default=None, help="directory of recorded {drugsfda,ndc,label}.json responses")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
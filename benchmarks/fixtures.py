@@ -0,0 +1,85 @@
+"""Synthetic openFDA-shaped records and bulk files for the benchmarks."""
+import io
+import json
+import random
+import zipfile
+
+BRANDS = ["Advil", "Tylenol", "Lipitor", "Zithromax", "Motrin", "Aleve", "Prilosec", "Zoloft", "Xanax", "Coumadin"]
+GENERICS = ["ibuprofen", "acetaminophen", "atorvastatin", "azithromycin", "naproxen", "omeprazole", "sertraline", "alprazolam", "warfarin", "amoxicillin"]
+MANUFACTURERS = ["Pfizer Laboratories", "Johnson & Johnson", "Bayer HealthCare", "Teva Pharmaceuticals", "Mylan", "Sandoz"]
+PHRASES = ["QT prolongation has been reported", "may cause serious liver injury", "avoid use with macrolide antibiotics",
+           "monitor INR closely", "risk of gastrointestinal bleeding", "discontinue if rash develops", "dose adjustment in renal impairment"]
+
+
+def openfda(i, rng):
+    return {"brand_name": [BRANDS[i % len(BRANDS)]], "generic_name": [GENERICS[i % len(GENERICS)].upper()],
+            "manufacturer_name": [MANUFACTURERS[i % len(MANUFACTURERS)]], "substance_name": [GENERICS[i % len(GENERICS)].upper()],
+            "rxcui": [str(100000 + i % 5000)], "product_ndc": [f"{i % 90000 + 10000:05d}-{i % 1000:03d}"], "route": ["ORAL"]}
+
+
+def ndc_record(i, rng):
+    ndc = f"{i % 90000 + 10000:05d}-{i % 1000:03d}"
+    return {"product_id": f"{ndc}_{i:08x}", "product_ndc": ndc, "brand_name": BRANDS[i % len(BRANDS)], "generic_name": GENERICS[i % len(GENERICS)].upper(),
+            "labeler_name": MANUFACTURERS[i % len(MANUFACTURERS)], "dosage_form": "TABLET", "route": ["ORAL"], "product_type": "HUMAN OTC DRUG",
+            "finished": True, "marketing_category": "ANDA", "application_number": f"ANDA{i % 100000:06d}",
+            "packaging": [{"package_ndc": f"{ndc}-{j:02d}", "description": f"{10 * (j + 1)} TABLET in 1 BOTTLE"} for j in range(2)],
+            "active_ingredients": [{"name": GENERICS[i % len(GENERICS)].upper(), "strength": "200 mg/1"}], "openfda": openfda(i, rng)}
+
+
+def label_record(i, rng, version=1):
+    text = lambda n: [" ".join(rng.choice(PHRASES) for _ in range(n))]
+    return {"set_id": f"{i:08x}-0000-4000-8000-000000000000", "id": f"{i:08x}-{version:04x}", "version": str(version),
+            "effective_time": f"20{10 + i % 15:02d}0101", "indications_and_usage": text(3), "warnings": text(5),
+            "adverse_reactions": text(8), "drug_interactions": text(4), "openfda": openfda(i, rng),
+            **({"boxed_warning": text(2)} if i % 7 == 0 else {})}
+
+
+def drugsfda_record(i, rng):
+    return {"application_number": f"NDA{i:06d}", "sponsor_name": MANUFACTURERS[i % len(MANUFACTURERS)].upper(),
+            "products": [{"product_number": "001", "brand_name": BRANDS[i % len(BRANDS)].upper(), "dosage_form": "TABLET",
+                          "marketing_status": "Prescription", "active_ingredients": [{"name": GENERICS[i % len(GENERICS)].upper()}]}],
+            "openfda": openfda(i, rng)}
+
+
+# Real SPL documents carry dozens of long sections, most of which a given route never shows.
+LONG_SECTIONS = ["clinical_pharmacology", "pharmacokinetics", "dosage_and_administration", "contraindications", "precautions",
+                 "overdosage", "description", "how_supplied", "clinical_studies", "references", "information_for_patients",
+                 "nonclinical_toxicology", "use_in_specific_populations", "mechanism_of_action", "spl_unclassified_section"]
+
+
+def pad_sections(doc, rng, section_kb):
+    """Fill LONG_SECTIONS of a label record with about `section_kb` KiB of text each."""
+    for name in LONG_SECTIONS:
+        words, text = [], 0
+        while text < section_kb * 1024:
+            words.append(rng.choice(PHRASES))
+            text += len(words[-1]) + 1
+        doc[name] = [" ".join(words)]
+    return doc
+
+
+RECORDS = {"ndc": ndc_record, "label": label_record, "drugsfda": drugsfda_record}
+
+
+def records(dataset, n, start=0, seed=0):
+    rng = random.Random(seed)
+    make = RECORDS[dataset]
+    for i in range(start, start + n):
+        yield make(i, rng)
+
+
+def write_bulk(path, dataset, docs):
+    """Write docs as an openFDA bulk file (zipped when path ends in .zip), streaming."""
+    def write(out):
+        out.write('{"meta": {"results": {"skip": 0, "limit": 0, "total": 0}}, "results": [')
+        for n, doc in enumerate(docs):
+            out.write(("," if n else "") + json.dumps(doc))
+        out.write("]}")
+
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive, archive.open(path.rsplit("/", 1)[-1][:-4], "w") as raw:
+            with io.TextIOWrapper(raw, encoding="utf-8") as out:
+                write(out)
+    else:
+        with open(path, "w", encoding="utf-8") as out:
+            write(out)
@@ -0,0 +1,258 @@
+"""Tiered response cache for openFDA queries.
+
+Responses are stored as serialized JSON bytes, first in a bounded in-process
+LRU and optionally in a size-capped SQLite file that survives restarts. Entries
+past their dataset TTL are still served for `stale` seconds while a background
+task refreshes them, and concurrent misses for the same key share one upstream
+call.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DAY = 24 * 60 * 60
+
+
+def dumps(obj):
+    return orjson.dumps(obj) if orjson else json.dumps(obj, separators=(",", ":")).encode()
+
+
+def loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def dataset_of(url):
+    # ".../drug/label.json" -> "label"
+    return urlsplit(url).path.rsplit("/", 1)[-1].split(".", 1)[0]
+
+
+def cache_key(url, search_query, limit):
+    return f"{url}|{' '.join(search_query.split())}|{limit}"
+
+
+class MemoryLRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, body, stored_at):
+        if len(body) > self.max_bytes:
+            return
+        self.pop(key)
+        self._entries[key] = (body, stored_at)
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            _, (old, _) = self._entries.popitem(last=False)
+            self.bytes -= len(old)
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[0])
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+
+class SQLiteTier:
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL NOT NULL, body BLOB NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at)")
+        self.bytes = self._size()
+
+    def _size(self):
+        return self._db.execute("SELECT coalesce(sum(length(body)), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def put(self, key, body, stored_at):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses (key, stored_at, body) VALUES (?, ?, ?)", (key, stored_at, body))
+            self.bytes += len(body)  # over-counts replaced rows; _trim recounts
+            if self.max_bytes and self.bytes > self.max_bytes:
+                self._trim()
+
+    def _trim(self):
+        # Oldest entries go first, down to 90% of max_bytes so a full file is not trimmed on every put.
+        self.bytes = self._size()
+        excess, doomed = self.bytes - int(self.max_bytes * 0.9), []
+        if excess <= 0:
+            return
+        for key, size in self._db.execute("SELECT key, length(body) FROM responses ORDER BY stored_at"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        self.bytes = self._size()
+
+    def prune(self, older_than):
+        with self._lock:
+            removed = self._db.execute("DELETE FROM responses WHERE stored_at < ?", (older_than,)).rowcount
+            self.bytes = self._size()
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self.bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, db_path=None, ttl=None, default_ttl=DAY, stale=3600, db_max_bytes=1024 ** 3):
+        self.memory = MemoryLRU(max_bytes)
+        self.disk = SQLiteTier(db_path, db_max_bytes) if db_path else None
+        self.ttl = dict(ttl or {})
+        self.default_ttl = default_ttl
+        self.stale = stale
+        self.counters = {"hits": 0, "stale_hits": 0, "disk_hits": 0, "misses": 0, "collapsed": 0, "refreshes": 0, "refresh_errors": 0}
+        self._inflight = {}
+        self._refreshing = set()
+        if self.disk:
+            self.disk.prune(time.time() - max([default_ttl, *self.ttl.values()]) - stale)
+
+    @classmethod
+    def from_env(cls):
+        ttl = {name: float(os.environ[f"CACHE_TTL_{name.upper()}"]) for name in ("drugsfda", "ndc", "label") if os.getenv(f"CACHE_TTL_{name.upper()}")}
+        return cls(
+            max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            db_path=os.getenv("CACHE_DB_PATH") or None,
+            db_max_bytes=int(os.getenv("CACHE_DB_MAX_BYTES", str(1024 ** 3))),
+            ttl=ttl,
+            default_ttl=float(os.getenv("CACHE_TTL", str(DAY))),
+            stale=float(os.getenv("CACHE_STALE_SECONDS", "3600")),
+        )
+
+    def stats(self):
+        return {**self.counters, "evictions": self.memory.evictions, "entries": len(self.memory), "bytes": self.memory.bytes,
+                "max_bytes": self.memory.max_bytes, "disk": self.disk.path if self.disk else None,
+                "disk_bytes": self.disk.bytes if self.disk else 0, "disk_evictions": self.disk.evictions if self.disk else 0}
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk:
+            self.disk.clear()
+
+    def close(self):
+        for task in list(self._refreshing):
+            task.cancel()
+        if self.disk:
+            self.disk.close()
+            self.disk = None
+
+    async def _lookup(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.disk:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                self.counters["disk_hits"] += 1
+                self.memory.put(key, *entry)
+        return entry
+
+    async def _store(self, key, data):
+        body, now = dumps(data), time.time()
+        self.memory.put(key, body, now)
+        if self.disk:
+            await asyncio.to_thread(self.disk.put, key, body, now)
+
+    async def _fetch_and_store(self, key, fetch, args):
+        data = await fetch(*args)
+        await self._store(key, data)
+        return dumps(data)
+
+    async def _fetch(self, key, fetch, args):
+        # Single-flight: concurrent misses share one fetch task owned by the cache. Callers await it
+        # shielded, so a cancelled caller (fan-out deadline, early stop) never cancels the others;
+        # the task itself is cancelled only once nobody is waiting for it.
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = [asyncio.create_task(self._fetch_and_store(key, fetch, args)), 0]
+
+            def done(task, flight=flight):
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                if not task.cancelled():
+                    task.exception()  # mark retrieved when every caller had left
+
+            flight[0].add_done_callback(done)
+        else:
+            self.counters["collapsed"] += 1
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return loads(await asyncio.shield(task))
+        finally:
+            flight[1] -= 1
+            if not flight[1] and not task.done():
+                task.cancel()
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+
+    def _refresh(self, key, fetch, args):
+        if key in self._inflight:
+            return
+
+        async def run():
+            try:
+                await self._fetch(key, fetch, args)
+                self.counters["refreshes"] += 1
+            except Exception:
+                self.counters["refresh_errors"] += 1
+
+        task = asyncio.create_task(run())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    async def get_or_fetch(self, url, search_query, limit, fetch):
+        key = cache_key(url, search_query, limit)
+        entry = await self._lookup(key)
+        if entry is not None:
+            body, stored_at = entry
+            age = time.time() - stored_at
+            ttl = self.ttl.get(dataset_of(url), self.default_ttl)
+            if age <= ttl:
+                self.counters["hits"] += 1
+                return loads(body)
+            if age <= ttl + self.stale:
+                self.counters["stale_hits"] += 1
+                self._refresh(key, fetch, (url, search_query, limit))
+                return loads(body)
+        self.counters["misses"] += 1
+        return await self._fetch(key, fetch, (url, search_query, limit))
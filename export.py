@@ -0,0 +1,79 @@
+"""Streaming export: page through a search, encode records as NDJSON or CSV.
+
+Pages are fetched by a producer task into a bounded queue, so at most
+`prefetch` pages are buffered ahead of the client; when the client reads
+slowly the producer blocks instead of accumulating records.
+"""
+import asyncio
+import csv
+import io
+
+from cache import dumps
+from local_index import values_at
+
+CSV_COLUMNS = {
+    "drugsfda": ["application_number", "sponsor_name", "openfda.brand_name", "openfda.generic_name", "openfda.manufacturer_name",
+                 "products.product_number", "products.dosage_form", "products.marketing_status"],
+    "ndc": ["product_id", "product_ndc", "brand_name", "generic_name", "labeler_name", "dosage_form", "route",
+            "marketing_category", "packaging.package_ndc", "openfda.rxcui"],
+    "label": ["set_id", "id", "version", "effective_time", "openfda.brand_name", "openfda.generic_name",
+              "openfda.manufacturer_name", "openfda.product_ndc", "openfda.rxcui"],
+}
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def prefetch(pages, depth):
+    """Re-yield an async iterator of pages, running up to `depth` pages ahead of the consumer."""
+    queue = asyncio.Queue(maxsize=depth)
+    done = object()
+
+    async def produce():
+        try:
+            async for page in pages:
+                await queue.put(page)
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        task.cancel()
+
+
+async def limited(pages, max_records):
+    remaining = max_records
+    async for page in pages:
+        if remaining is not None:
+            page = page[:remaining]
+            remaining -= len(page)
+        if page:
+            yield page
+        if remaining == 0:
+            return
+
+
+async def encode(pages, fmt, columns):
+    """One chunk of bytes per page."""
+    if fmt == "ndjson":
+        async for page in pages:
+            yield b"".join(dumps(r) + b"\n" for r in page)
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    async for page in pages:
+        for record in page:
+            writer.writerow(["|".join(map(str, values_at(record, c))) for c in columns])
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
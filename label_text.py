@@ -0,0 +1,344 @@
+"""Ranked full-text search over label sections, in SQLite FTS5.
+
+Every text section of a label is one FTS5 row, tokenized with unicode61 and
+stemmed with the porter tokenizer. Its rowid packs (weight tier, label id,
+section id), so rowid order visits the highest-weighted sections first.
+A query is split into terms, without stopwords. A label scores the sum of its
+matching sections' BM25 scores, each multiplied by the section's weight.
+Snippets of the best sections come from FTS5's snippet().
+
+Ranking every matching section would grow with the corpus, so each tier
+scores at most `candidates` sections, read in rowid order. When a tier has
+more matches, the result is the best of its highest-weighted sections and
+`meta.exhaustive` is false.
+
+Labels are added incrementally. They come from bulk files
+(`python -m label_text ingest`), from an existing local index, or from
+label responses the app fetches from openFDA. Re-adding an unchanged label
+version is a no-op. The database is read through mmap, so several uvicorn
+workers opening the same file share its pages in the OS page cache.
+"""
+import argparse
+import heapq
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from cache import dumps, loads
+from local_index import LocalIndex, iter_results, label_sections, open_bulk
+
+SECTION_BITS = 8
+SECTION_MASK = (1 << SECTION_BITS) - 1
+LABEL_BITS = 40
+LABEL_MASK = (1 << LABEL_BITS) - 1
+TIER_SHIFT = SECTION_BITS + LABEL_BITS
+MAX_TERMS = 12
+CANDIDATE_ROWS = 2000  # sections scored per tier
+TOKEN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = set("a an and are as at be by for from has have in is it its may of on or that the their this to was were when which will with without".split())
+
+# Sections clinicians search first rank higher; boilerplate and packaging text lower.
+SECTION_WEIGHTS = {
+    "boxed_warning": 3.0, "contraindications": 2.0, "warnings_and_cautions": 2.0, "warnings": 2.0, "drug_interactions": 2.0,
+    "indications_and_usage": 1.5, "adverse_reactions": 1.5, "precautions": 1.5, "use_in_specific_populations": 1.2,
+    "overdosage": 1.2, "clinical_pharmacology": 1.0, "mechanism_of_action": 1.0, "dosage_and_administration": 1.0,
+    "description": 0.5, "how_supplied": 0.3, "storage_and_handling": 0.3, "inactive_ingredient": 0.3, "references": 0.3,
+    "spl_unclassified_section": 0.3, "package_label_principal_display_panel": 0.2, "spl_product_data_elements": 0.2,
+}
+
+# Rowid tier of a section: 0 for the highest weight. Unknown sections weigh 1.0.
+WEIGHT_TIERS = {w: i for i, w in enumerate(sorted({*SECTION_WEIGHTS.values(), 1.0}, reverse=True))}
+
+
+def section_rowid(label_id, section_id, name):
+    return (WEIGHT_TIERS[SECTION_WEIGHTS.get(name, 1.0)] << TIER_SHIFT) | (label_id << SECTION_BITS) | section_id
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (id INTEGER PRIMARY KEY, set_id TEXT NOT NULL UNIQUE, version_id TEXT, doc BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS sections (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE VIRTUAL TABLE IF NOT EXISTS section_text USING fts5 (body, tokenize = 'porter unicode61 remove_diacritics 2');
+CREATE TABLE IF NOT EXISTS counts (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def query_terms(text):
+    terms = [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+    return list(dict.fromkeys(terms))[:MAX_TERMS]
+
+
+def fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+class LabelTextIndex:
+    def __init__(self, path, mmap_bytes=1 << 30, candidates=CANDIDATE_ROWS):
+        self.path = path
+        self.candidates = candidates
+        self.db = self._connect(mmap_bytes)
+        self.mmap_bytes = mmap_bytes
+        self.db.executescript(SCHEMA)
+        # The label count is kept in the file, by every process that writes, so stats() never scans labels.
+        self.db.execute("INSERT OR IGNORE INTO counts (name, value) SELECT 'labels', count(*) FROM labels")
+        self._section_ids, self._section_names = {}, {}
+        self._load_sections(self.db)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._readers = []
+        self._pending = queue.SimpleQueue()
+        self._writer = None
+        self.counters = {"added": 0, "unchanged": 0, "queued": 0, "write_errors": 0}
+
+    def _connect(self, mmap_bytes=0):
+        db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        if mmap_bytes:
+            db.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+        return db
+
+    def _reader(self):
+        # One connection per thread: searches run in the threadpool, next to the writer thread.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect(self.mmap_bytes)
+            self._readers.append(db)
+        return db
+
+    def _load_sections(self, db):
+        # Other workers may have added section names since this process last looked.
+        for name, sid in db.execute("SELECT name, id FROM sections"):
+            self._section_ids[name], self._section_names[sid] = sid, name
+
+    def close(self):
+        if self._writer:
+            self._pending.put(None)
+            self._writer.join(10)
+            self._writer = None
+        for db in self._readers:
+            db.close()
+        self._readers.clear()
+        self.db.close()
+
+    def stats(self):
+        labels = self._reader().execute("SELECT value FROM counts WHERE name = 'labels'").fetchone()[0]
+        return {**self.counters, "labels": labels, "sections": len(self._section_ids), "path": self.path,
+                "pending": self._pending.qsize()}
+
+    # ==================== WRITES ====================
+    def _section_id(self, db, name, new):
+        sid = self._section_ids.get(name) or new.get(name)
+        if sid is None:
+            db.execute("INSERT OR IGNORE INTO sections (name) VALUES (?)", (name,))
+            sid = db.execute("SELECT id FROM sections WHERE name = ?", (name,)).fetchone()[0]
+            if sid >= 1 << SECTION_BITS:
+                raise ValueError(f"too many distinct label sections (> {SECTION_MASK})")
+            new[name] = sid
+        return sid
+
+    def add(self, docs, db=None):
+        """Index label documents in one transaction; returns how many were new or changed."""
+        db = db or self.db
+        added, new = 0, {}
+        with self._lock:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for doc in docs:
+                    added += self._add(db, doc, new)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            # Section ids of this transaction are published only once committed; a rollback leaves nothing behind.
+            for name, sid in new.items():
+                self._section_ids[name], self._section_names[sid] = sid, name
+        self.counters["added"] += added
+        return added
+
+    def _add(self, db, doc, new):
+        set_id, version_id = doc.get("set_id"), doc.get("id")
+        if not set_id:
+            return 0
+        row = db.execute("SELECT id, version_id FROM labels WHERE set_id = ?", (set_id,)).fetchone()
+        if row and row[1] == version_id:
+            self.counters["unchanged"] += 1
+            return 0
+        if row:
+            for tier in WEIGHT_TIERS.values():
+                first = (tier << TIER_SHIFT) | (row[0] << SECTION_BITS)
+                db.execute("DELETE FROM section_text WHERE rowid BETWEEN ? AND ?", (first, first | SECTION_MASK))
+            db.execute("DELETE FROM labels WHERE id = ?", (row[0],))
+        else:
+            db.execute("UPDATE counts SET value = value + 1 WHERE name = 'labels'")
+        label_id = db.execute("INSERT INTO labels (set_id, version_id, doc) VALUES (?, ?, ?)", (set_id, version_id, dumps(doc))).lastrowid
+        rows = [(section_rowid(label_id, self._section_id(db, name, new), name), "\n".join(map(str, doc[name]))) for name in label_sections(doc)]
+        db.executemany("INSERT INTO section_text (rowid, body) VALUES (?, ?)", rows)
+        return 1
+
+    def submit(self, docs):
+        """Queue fetched labels for a background writer thread, so request handlers never wait on a write."""
+        docs = [d for d in docs if isinstance(d, dict) and d.get("set_id")]
+        if not docs:
+            return
+        self.counters["queued"] += len(docs)
+        self._pending.put(docs)
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_pending, name="label-text-writer", daemon=True)
+            self._writer.start()
+
+    def _write_pending(self):
+        db = self._connect()
+        try:
+            while True:
+                batch = self._pending.get()
+                if batch is None:
+                    return
+                while not self._pending.empty() and len(batch) < 500:
+                    more = self._pending.get()
+                    if more is None:
+                        self._pending.put(None)
+                        break
+                    batch.extend(more)
+                try:
+                    self.add(batch, db)
+                except sqlite3.OperationalError:  # locked or busy: drop the batch, later fetches bring the labels back
+                    self.counters["write_errors"] += 1
+                except Exception:
+                    # One bad label (e.g. past the section limit) must not drop the batch or kill the writer.
+                    for doc in batch:
+                        try:
+                            self.add([doc], db)
+                        except Exception:
+                            self.counters["write_errors"] += 1
+        finally:
+            db.close()
+
+    # ==================== SEARCH ====================
+    def _candidates(self, db, match, wanted):
+        """(rowid, bm25) of at most `candidates` matching sections, highest-weighted first, and whether more matched."""
+        sql, params = "SELECT rowid, bm25(section_text) FROM section_text WHERE section_text MATCH ?", [match]
+        if wanted:
+            sql += f" AND (rowid & {SECTION_MASK}) IN ({','.join('?' * len(wanted))})"
+            params.extend(wanted)
+        rows = db.execute(sql + " ORDER BY rowid LIMIT ?", (*params, self.candidates + 1)).fetchall()
+        return rows[:self.candidates], len(rows) > self.candidates
+
+    def _tiers(self, db, phrases):
+        # All terms; then any of the rare ones, whose matches fit the candidate window; then any term at all.
+        yield "all", " AND ".join(phrases)
+        if len(phrases) == 1:
+            return
+        sql = "SELECT count(*) FROM (SELECT 1 FROM section_text WHERE section_text MATCH ? LIMIT ?)"
+        rare = [p for p in phrases if db.execute(sql, (p, self.candidates)).fetchone()[0] < self.candidates]
+        if rare:
+            yield "any", " OR ".join(rare)
+        if len(rare) < len(phrases):
+            yield "any", " OR ".join(phrases)
+
+    def search(self, text, limit=10, sections=None, highlights=3, snippet_tokens=32):
+        """Labels ranked for a free-text query, each with highlighted snippets of its best sections.
+
+        Sections containing every term are matched first; only when they name
+        fewer than `limit` labels are sections with any of the rarer terms
+        added, then sections with any term, each tier ranking after the one
+        before.
+        """
+        started = time.perf_counter()
+        terms = query_terms(text)
+        if not terms:
+            raise ValueError("query has no searchable terms")
+        db = self._reader()
+        wanted = None
+        if sections:
+            if any(s not in self._section_ids for s in sections):
+                self._load_sections(db)
+            wanted = [self._section_ids[s] for s in sections if s in self._section_ids]
+            if not wanted:
+                return {"meta": {"results": {"total": 0}, "terms": terms, "exhaustive": True, "ms": 0.0}, "results": []}
+        phrases = [fts_phrase(t) for t in terms]
+        scores, best, tier_of, match_of, exhaustive = {}, {}, {}, {}, True
+        if db.execute("SELECT count(*) FROM sections").fetchone()[0] != len(self._section_ids):
+            self._load_sections(db)
+        for n, (tier, match) in enumerate(self._tiers(db, phrases)):
+            if n and len(scores) >= limit:
+                break
+            rows, truncated = self._candidates(db, match, wanted)
+            exhaustive = exhaustive and not truncated
+            for rowid, rank in rows:
+                label_id = (rowid >> SECTION_BITS) & LABEL_MASK
+                if tier_of.setdefault(label_id, n) != n:
+                    continue
+                match_of[label_id] = tier
+                score = -rank * SECTION_WEIGHTS.get(self._section_names.get(rowid & SECTION_MASK), 1.0)
+                scores[label_id] = scores.get(label_id, 0.0) + score
+                best.setdefault(label_id, {})[rowid] = score
+        ranked = heapq.nlargest(limit, scores, key=lambda i: (-tier_of[i], scores[i]))
+        tops = {i: heapq.nlargest(highlights, best[i], key=best[i].get) for i in ranked}
+        snippets = self._snippets(db, phrases, [r for top in tops.values() for r in top], snippet_tokens)
+        docs = dict(db.execute(f"SELECT id, doc FROM labels WHERE id IN ({','.join('?' * len(ranked))})", ranked)) if ranked else {}
+        results = [{"doc": loads(docs[i]), "score": scores[i], "match": match_of[i],
+                    "highlights": [{"section": self._section_names.get(r & SECTION_MASK), "snippet": snippets.get(r)} for r in top]}
+                   for i, top in tops.items()]
+        ms = round((time.perf_counter() - started) * 1000, 2)
+        return {"meta": {"results": {"total": len(scores)}, "terms": terms, "exhaustive": exhaustive, "ms": ms}, "results": results}
+
+    def _snippets(self, db, phrases, rowids, size):
+        if not rowids:
+            return {}
+        match = " OR ".join(phrases)
+        return dict(db.execute(
+            f"SELECT rowid, snippet(section_text, 0, '<mark>', '</mark>', '…', ?) FROM section_text "
+            f"WHERE section_text MATCH ? AND rowid IN ({','.join('?' * len(rowids))})", (size, match, *rowids)))
+
+
+def iter_label_docs(args):
+    if args.command == "from-index":
+        yield from LocalIndex(args.index).iter_docs("label")
+        return
+    for path in args.files:
+        with open_bulk(path) as stream:
+            yield from iter_results(stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m label_text")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ingest", help="add labels from openFDA label bulk files")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--db", default=os.getenv("LABEL_TEXT_INDEX", "label_text.db"))
+    p = sub.add_parser("from-index", help="add every label stored in a local index built by `python -m local_index`")
+    p.add_argument("index", nargs="?", default=os.getenv("LOCAL_INDEX_PATH", "drug_index.db"))
+    p.add_argument("--db", default=os.getenv("LABEL_TEXT_INDEX", "label_text.db"))
+    p = sub.add_parser("search", help="run a ranked query against the index")
+    p.add_argument("query")
+    p.add_argument("--db", default=os.getenv("LABEL_TEXT_INDEX", "label_text.db"))
+    p.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args(argv)
+    index = LabelTextIndex(args.db)
+    try:
+        if args.command == "search":
+            data = index.search(args.query, args.limit)
+            print(f"{data['meta']['results']['total']} labels, {data['meta']['ms']} ms, terms {data['meta']['terms']}")
+            for r in data["results"]:
+                print(f"{r['score']:10.4g}  {r['doc'].get('set_id')}  {', '.join(r['doc'].get('openfda', {}).get('brand_name', []))}")
+                for h in r["highlights"]:
+                    print(f"            {h['section']}: {h['snippet']}")
+            return
+        started, added, batch = time.perf_counter(), 0, []
+        for doc in iter_label_docs(args):
+            batch.append(doc)
+            if len(batch) == 1000:
+                added += index.add(batch)
+                batch = []
+        added += index.add(batch)
+        print(f"added or updated {added} labels in {args.db} in {time.perf_counter() - started:.1f}s; {index.stats()['labels']} indexed")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
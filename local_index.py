@@ -0,0 +1,585 @@
+"""Offline backend: openFDA bulk download files indexed in SQLite.
+
+Build (or rebuild) the index from the zipped bulk exports, then start the app
+with DATA_BACKEND=local:
+
+    python -m local_index ingest --db drug_index.db drug-label-*.json.zip drug-ndc-*.json.zip drug-drugsfda-*.json.zip
+
+When openFDA republishes, `refresh` with the new files applies only the
+changed records to the live index (see refresh()). Each `ingest` builds a new
+versioned file (`drug_index.db.<n>`) and repoints the `drug_index.db` symlink
+at it (see publish()).
+
+Identifier fields go into an exact-match key table, free-text fields into an
+FTS5 table, and each record is stored once as JSON so responses keep the
+openFDA shape.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+
+from cache import dumps, loads
+
+OPENFDA_EXACT = ["openfda.rxcui", "openfda.unii", "openfda.spl_id", "openfda.spl_set_id", "openfda.product_ndc",
+                 "openfda.package_ndc", "openfda.application_number", "openfda.upc", "openfda.is_original_packager"]
+OPENFDA_TEXT = ["openfda.brand_name", "openfda.generic_name", "openfda.manufacturer_name", "openfda.substance_name",
+                "openfda.route", "openfda.product_type", "openfda.pharm_class_epc", "openfda.pharm_class_pe",
+                "openfda.pharm_class_moa", "openfda.pharm_class_cs"]
+
+# key: record identity; exact: case-insensitive whole-value lookups; text: tokenized phrase search.
+# Label text sections are discovered per record (see label_sections).
+DATASETS = {
+    "drugsfda": {
+        "key": "application_number",
+        "exact": ["application_number", "products.product_number", *OPENFDA_EXACT],
+        "text": ["sponsor_name", "products.brand_name", "products.dosage_form", "products.route", "products.marketing_status",
+                 "products.active_ingredients.name", *OPENFDA_TEXT],
+    },
+    "ndc": {
+        "key": "product_id",
+        "exact": ["product_id", "product_ndc", "packaging.package_ndc", "application_number", "spl_id", "dea_schedule", "finished", *OPENFDA_EXACT],
+        "text": ["brand_name", "generic_name", "labeler_name", "dosage_form", "route", "product_type", "marketing_category",
+                 "active_ingredients.name", "pharm_class", *OPENFDA_TEXT],
+    },
+    "label": {
+        "key": "set_id",
+        "exact": ["set_id", "id", "version", "effective_time", *OPENFDA_EXACT],
+        "text": OPENFDA_TEXT,
+    },
+}
+
+# fts rowids pack (doc_id, field_id) so matches resolve to documents without touching stored content.
+FIELD_BITS = 12
+MAX_DOC_ID = (1 << (63 - FIELD_BITS)) - 2
+TOKEN = re.compile(r"\w+", re.UNICODE)
+RANGE = re.compile(r"^\[(.+?)(?:\+|\s)+TO(?:\+|\s)+(.+?)\]$")
+CONNECTIVE = re.compile(r"(?:\+|\s)+(AND|OR)(?:\+|\s)+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, dataset TEXT NOT NULL, key TEXT NOT NULL, version TEXT, source TEXT, digest TEXT, doc BLOB NOT NULL);
+CREATE UNIQUE INDEX IF NOT EXISTS docs_key ON docs (dataset, key);
+CREATE TABLE IF NOT EXISTS fields (id INTEGER PRIMARY KEY, dataset TEXT NOT NULL, name TEXT NOT NULL, UNIQUE (dataset, name));
+CREATE TABLE IF NOT EXISTS keys (field_id INTEGER NOT NULL, value TEXT, doc_id INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS keys_lookup ON keys (field_id, value, doc_id);
+CREATE INDEX IF NOT EXISTS keys_doc ON keys (doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5 (fkey, body);
+CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, dataset TEXT NOT NULL, checksum TEXT, records INTEGER, ingested_at REAL);
+"""
+
+
+def values_at(doc, path):
+    """All scalar values at a dotted path, flattening lists on the way."""
+    nodes = [doc]
+    for part in path.split("."):
+        nxt = []
+        for node in nodes:
+            for item in node if isinstance(node, list) else [node]:
+                if isinstance(item, dict) and part in item:
+                    nxt.append(item[part])
+        nodes = nxt
+    out = []
+    for node in nodes:
+        out.extend(node if isinstance(node, list) else [node])
+    return [v for v in out if v is not None and not isinstance(v, (dict, list))]
+
+
+def label_sections(doc):
+    exact = DATASETS["label"]["exact"]
+    return [k for k, v in doc.items() if k not in exact and not k.endswith("_table") and isinstance(v, list) and v and isinstance(v[0], str)]
+
+
+def as_text(value):
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def record_key(dataset, doc):
+    values = values_at(doc, DATASETS[dataset]["key"])
+    return as_text(values[0]) if values else None
+
+
+def record_version(dataset, doc):
+    values = values_at(doc, "version") if dataset == "label" else []
+    return as_text(values[0]) if values else None
+
+
+# ==================== STREAMING BULK READER ====================
+def iter_results(stream, chunk_size=1 << 20):
+    """Yield the objects of the top-level "results" array without reading the whole file."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+        return not eof
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or not fill():
+                return buf[pos:pos + 1]
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"malformed openFDA bulk file: expected {char!r} at {buf[pos:pos + 40]!r}")
+        pos += 1
+
+    def decode():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if end < len(buf) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    expect("{")
+    while peek() != "}":
+        key = decode()
+        expect(":")
+        if key != "results":
+            decode()
+        else:
+            expect("[")
+            while peek() != "]":
+                yield decode()
+                if peek() == ",":
+                    pos += 1
+            expect("]")
+        if peek() == ",":
+            pos += 1
+
+
+def open_bulk(path):
+    """Text stream over a bulk file, reading zip members lazily."""
+    if path.endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        name = next(n for n in archive.namelist() if n.endswith(".json"))
+        return io.TextIOWrapper(archive.open(name), encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def partition_checksum(path):
+    """Cheap change detector for a bulk partition: the zip member CRC, or a sha256 of plain files."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            info = next(i for i in archive.infolist() if i.filename.endswith(".json"))
+            return f"crc32:{info.CRC:08x}:{info.file_size}"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def dataset_from_filename(path):
+    name = os.path.basename(path)
+    for dataset in DATASETS:
+        if f"-{dataset}-" in name or name.startswith(f"{dataset}-"):
+            return dataset
+    raise ValueError(f"cannot tell dataset from file name {name!r}; pass --dataset")
+
+
+# ==================== INDEX WRITER ====================
+class IndexWriter:
+    def __init__(self, db):
+        self.db = db
+        self.db.executescript(SCHEMA)
+        self._field_ids = {(d, n): i for i, d, n in db.execute("SELECT id, dataset, name FROM fields")}
+
+    def field_id(self, dataset, name):
+        fid = self._field_ids.get((dataset, name))
+        if fid is None:
+            fid = self.db.execute("INSERT INTO fields (dataset, name) VALUES (?, ?)", (dataset, name)).lastrowid
+            if fid >= 1 << FIELD_BITS:
+                raise ValueError(f"too many distinct fields (> {(1 << FIELD_BITS) - 1})")
+            self._field_ids[(dataset, name)] = fid
+        return fid
+
+    def add(self, dataset, doc, source=None, body=None):
+        key = record_key(dataset, doc)
+        if key is None:
+            return None
+        body = body or dumps(doc)
+        cur = self.db.execute("INSERT OR IGNORE INTO docs (dataset, key, version, source, digest, doc) VALUES (?, ?, ?, ?, ?, ?)",
+                              (dataset, key, record_version(dataset, doc), source, digest_of(body), body))
+        if not cur.rowcount:
+            return None
+        doc_id = cur.lastrowid
+        spec = DATASETS[dataset]
+        keys, fts = [], []
+        for name in doc:
+            keys.append((self.field_id(dataset, name), None, doc_id))
+        for name in spec["exact"]:
+            values = values_at(doc, name)
+            if values:
+                fid = self.field_id(dataset, name)
+                if "." in name:
+                    keys.append((fid, None, doc_id))
+                keys.extend((fid, as_text(v).lower(), doc_id) for v in set(values))
+        text_fields = spec["text"] + (label_sections(doc) if dataset == "label" else [])
+        for name in text_fields:
+            values = values_at(doc, name)
+            if values:
+                fid = self.field_id(dataset, name)
+                if "." in name:
+                    keys.append((fid, None, doc_id))
+                fts.append(((doc_id << FIELD_BITS) | fid, f"f{fid}", "\n".join(map(as_text, values))))
+        self.db.executemany("INSERT INTO keys (field_id, value, doc_id) VALUES (?, ?, ?)", keys)
+        self.db.executemany("INSERT INTO fts (rowid, fkey, body) VALUES (?, ?, ?)", fts)
+        return doc_id
+
+    def remove(self, doc_id):
+        self.db.execute("DELETE FROM keys WHERE doc_id = ?", (doc_id,))
+        self.db.execute("DELETE FROM fts WHERE rowid BETWEEN ? AND ?", (doc_id << FIELD_BITS, ((doc_id + 1) << FIELD_BITS) - 1))
+        self.db.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+
+
+def digest_of(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def connect_for_write(path):
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("PRAGMA synchronous=OFF")
+    db.execute("PRAGMA journal_mode=OFF")
+    db.execute("PRAGMA cache_size=-262144")
+    return db
+
+
+def resolve(db_path):
+    """The versioned index file db_path points to (db_path itself for an index built before versioning)."""
+    return os.path.realpath(db_path)
+
+
+def publish(db_path, building):
+    """Atomically repoint the db_path symlink at a finished build.
+
+    A live WAL database is never replaced in place: readers keep the file they
+    have open, with its own -wal/-shm, and move to the new one on their next
+    query (LocalIndex._sync). The previous build is kept for readers still on
+    it; older builds are removed.
+    """
+    previous = resolve(db_path) if os.path.lexists(db_path) else None
+    link = building + ".link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(building), link)
+    os.replace(link, db_path)
+    keep = {os.path.realpath(building), previous}
+    directory, base = os.path.split(os.path.abspath(db_path))
+    for name in os.listdir(directory):
+        m = re.fullmatch(re.escape(base) + r"(\.\d+)(-journal|-wal|-shm)?", name)
+        if m and os.path.join(directory, base + m.group(1)) not in keep:
+            os.remove(os.path.join(directory, name))
+
+
+def ingest(db_path, files, dataset=None, batch_size=2000, log=print):
+    """Build a fresh index from bulk files into a new versioned file and publish it as db_path."""
+    building = f"{db_path}.{time.time_ns()}"
+    db = connect_for_write(building)
+    writer = IndexWriter(db)
+    total, started = 0, time.perf_counter()
+    for path in files:
+        ds, name = dataset or dataset_from_filename(path), os.path.basename(path)
+        count = 0
+        db.execute("BEGIN")
+        with open_bulk(path) as stream:
+            for doc in iter_results(stream):
+                if writer.add(ds, doc, name) is None:
+                    continue
+                count += 1
+                if count % batch_size == 0:
+                    db.execute("COMMIT")
+                    db.execute("BEGIN")
+        db.execute("INSERT OR REPLACE INTO sources (name, dataset, checksum, records, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                   (name, ds, partition_checksum(path), count, time.time()))
+        db.execute("COMMIT")
+        total += count
+        log(f"{path}: {count} {ds} records")
+    db.execute("ANALYZE")
+    db.execute("PRAGMA journal_mode=WAL")
+    db.close()
+    publish(db_path, building)
+    log(f"indexed {total} records into {db_path} in {time.perf_counter() - started:.1f}s")
+    return total
+
+
+def refresh(db_path, files, dataset=None, log=print):
+    """Apply a republished set of bulk files to an existing index in place.
+
+    Partitions whose checksum is unchanged are skipped. Records in changed
+    partitions are diffed by key and content digest, so only inserts, updates
+    and deletes are written. Everything is applied in one WAL transaction:
+    readers keep their snapshot until it commits and never see a partial refresh.
+    `files` must be the complete current partition list of each dataset given;
+    partitions missing from it are treated as removed.
+    """
+    started = time.perf_counter()
+    groups = {}
+    for path in files:
+        groups.setdefault(dataset or dataset_from_filename(path), []).append(path)
+    db = sqlite3.connect(resolve(db_path), isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA temp_store=FILE")
+    writer = IndexWriter(db)
+    db.execute("CREATE TEMP TABLE seen (key TEXT PRIMARY KEY)")
+    stats = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "skipped_partitions": 0}
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        for ds, paths in groups.items():
+            known = dict(db.execute("SELECT name, checksum FROM sources WHERE dataset = ?", (ds,)))
+            checksums = {os.path.basename(p): partition_checksum(p) for p in paths}
+            changed = [p for p in paths if known.get(os.path.basename(p)) != checksums[os.path.basename(p)]]
+            gone = set(known) - set(checksums)
+            stats["skipped_partitions"] += len(paths) - len(changed)
+            if not changed and not gone:
+                continue
+            db.execute("DELETE FROM seen")
+            for path in changed:
+                name, count = os.path.basename(path), 0
+                with open_bulk(path) as stream:
+                    for doc in iter_results(stream):
+                        key = record_key(ds, doc)
+                        if key is None:
+                            continue
+                        count += 1
+                        db.execute("INSERT OR IGNORE INTO seen (key) VALUES (?)", (key,))
+                        body = dumps(doc)
+                        row = db.execute("SELECT id, digest, source FROM docs WHERE dataset = ? AND key = ?", (ds, key)).fetchone()
+                        if row is None:
+                            writer.add(ds, doc, name, body)
+                            stats["inserted"] += 1
+                        elif row[1] != digest_of(body):
+                            writer.remove(row[0])
+                            writer.add(ds, doc, name, body)
+                            stats["updated"] += 1
+                        else:
+                            if row[2] != name:
+                                db.execute("UPDATE docs SET source = ? WHERE id = ?", (name, row[0]))
+                            stats["unchanged"] += 1
+                db.execute("INSERT OR REPLACE INTO sources (name, dataset, checksum, records, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                           (name, ds, checksums[name], count, time.time()))
+                log(f"{path}: {count} {ds} records")
+            stale = [os.path.basename(p) for p in changed] + sorted(gone)
+            marks = ",".join("?" * len(stale))
+            doomed = db.execute(f"SELECT id FROM docs WHERE dataset = ? AND source IN ({marks}) AND key NOT IN (SELECT key FROM seen)", (ds, *stale)).fetchall()
+            for (doc_id,) in doomed:
+                writer.remove(doc_id)
+            stats["deleted"] += len(doomed)
+            db.executemany("DELETE FROM sources WHERE dataset = ? AND name = ?", [(ds, name) for name in gone])
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    finally:
+        db.close()
+    log(f"refreshed {db_path} in {time.perf_counter() - started:.1f}s: {stats}")
+    return stats
+
+
+# ==================== QUERY ====================
+def top_level(expr):
+    """Offsets in `expr` outside quoted phrases and parentheses."""
+    out, depth, quoted, escaped = set(), 0, False, False
+    for i, ch in enumerate(expr):
+        if quoted:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                quoted = False
+        elif ch == '"':
+            quoted = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif depth == 0:
+            out.add(i)
+    return out
+
+
+def split_connective(expr, word):
+    parts, last, top = [], 0, top_level(expr)
+    for m in CONNECTIVE.finditer(expr):
+        if m.group(1) == word and m.start() in top:
+            parts.append(expr[last:m.start()])
+            last = m.end()
+    parts.append(expr[last:])
+    return [p.strip() for p in parts]
+
+
+def unquote(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value.replace("+", " ")  # unquoted values may still use the URL form of a space
+
+
+class LocalIndex:
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"local index {path!r} not found; build it with `python -m local_index ingest`")
+        self.path = path
+        self._local = threading.local()
+        self._readers = []
+
+    def _open(self):
+        # Open the resolved file, so its -wal/-shm are named after the build and never shared with another one.
+        local = self._local
+        local.file = resolve(self.path)
+        local.db = sqlite3.connect(f"file:{local.file}?mode=ro", uri=True, check_same_thread=False, isolation_level=None)
+        local.data_version = None
+        self._readers.append(local.db)
+
+    def _sync(self):
+        # One connection per thread: searches run in the threadpool. Reopen after `ingest` published a rebuilt
+        # file; reload field ids after a `refresh` committed.
+        local = self._local
+        if getattr(local, "db", None) is None:
+            self._open()
+        elif resolve(self.path) != local.file:
+            self._readers.remove(local.db)
+            local.db.close()
+            self._open()
+        version = local.db.execute("PRAGMA data_version").fetchone()[0]
+        if version != local.data_version:
+            local.field_ids = {(d, n): i for i, d, n in local.db.execute("SELECT id, dataset, name FROM fields")}
+            local.data_version = version
+        return local.db
+
+    @property
+    def _field_ids(self):
+        return self._local.field_ids
+
+    def close(self):
+        for db in self._readers:
+            db.close()
+        self._readers.clear()
+
+    def iter_docs(self, dataset):
+        """Every stored document of a dataset, on a private connection so it can run in a worker thread."""
+        db = sqlite3.connect(f"file:{resolve(self.path)}?mode=ro", uri=True)
+        try:
+            for (body,) in db.execute("SELECT doc FROM docs WHERE dataset = ?", (dataset,)):
+                yield loads(body)
+        finally:
+            db.close()
+
+    def known(self, dataset, field):
+        spec = DATASETS[dataset]
+        return field in spec["exact"] or field in spec["text"] or (dataset, field) in self._field_ids
+
+    def _clause(self, dataset, clause, params, after, upto):
+        if clause.startswith("(") and clause.endswith(")"):
+            return self._expr(dataset, clause[1:-1], params, after, upto)
+        field, sep, value = clause.partition(":")
+        if not sep:
+            raise ValueError(f"unsupported query clause {clause!r}")
+        if field == "_exists_":
+            fid = self._field_ids.get((dataset, value))
+            params.extend([fid, after, upto])
+            return "SELECT doc_id FROM keys WHERE field_id = ? AND value IS NULL AND doc_id > ? AND doc_id <= ?"
+        if not self.known(dataset, field):
+            raise ValueError(f"field {field!r} is not indexed for {dataset}")
+        fid = self._field_ids.get((dataset, field))
+        if field in DATASETS[dataset]["exact"]:
+            m = RANGE.match(value)
+            if m:
+                params.extend([fid, m.group(1).lower(), m.group(2).lower(), after, upto])
+                return "SELECT doc_id FROM keys WHERE field_id = ? AND value BETWEEN ? AND ? AND doc_id > ? AND doc_id <= ?"
+            params.extend([fid, unquote(value).lower(), after, upto])
+            return "SELECT doc_id FROM keys WHERE field_id = ? AND value = ? AND doc_id > ? AND doc_id <= ?"
+        tokens = TOKEN.findall(unquote(value))
+        if fid is None or not tokens:
+            params.append(-1)
+            return "SELECT doc_id FROM keys WHERE field_id = ?"
+        params.extend([f'fkey : f{fid} AND body : "{" ".join(tokens)}"', (after + 1) << FIELD_BITS, (upto + 1) << FIELD_BITS])
+        return f"SELECT rowid >> {FIELD_BITS} AS doc_id FROM fts WHERE fts MATCH ? AND rowid >= ? AND rowid < ?"
+
+    def _expr(self, dataset, expr, params, after=0, upto=MAX_DOC_ID):
+        # Every clause only reads doc ids in (after, upto], so keyset pages never re-read other pages' matches.
+        ors = []
+        for part in split_connective(expr, "OR"):
+            ands = [self._clause(dataset, c, params, after, upto) for c in split_connective(part, "AND")]
+            ors.append(ands[0] if len(ands) == 1 else " INTERSECT ".join(f"SELECT doc_id FROM ({a})" for a in ands))
+        return ors[0] if len(ors) == 1 else " UNION ".join(f"SELECT doc_id FROM ({o})" for o in ors)
+
+    def search(self, dataset, search_query, limit=10, skip=0):
+        """Answer an openFDA `search` expression with an openFDA-shaped response."""
+        db = self._sync()
+        params = []
+        # Field ids are per dataset, so the id set never crosses datasets.
+        ids = f"SELECT DISTINCT doc_id FROM ({self._expr(dataset, search_query.strip(), params)})"
+        page = f"SELECT doc_id FROM ({ids}) ORDER BY doc_id LIMIT ? OFFSET ?"
+        # One read transaction so the count and the page come from the same snapshot.
+        db.execute("BEGIN")
+        try:
+            total = db.execute(f"SELECT count(*) FROM ({ids})", params).fetchone()[0]
+            rows = db.execute(f"SELECT doc FROM docs WHERE id IN ({page}) ORDER BY id", [*params, limit, skip]).fetchall()
+        finally:
+            db.execute("COMMIT")
+        return {"meta": {"results": {"skip": skip, "limit": limit, "total": total}}, "results": [loads(r[0]) for r in rows]}
+
+    def search_after(self, dataset, search_query, limit, after=0):
+        """Up to `limit` matching documents past doc id `after`, in id order, and the id to continue after.
+
+        Keyset pages without a count. Matches are read in doc id windows that
+        widen while they come back short, so a page costs about the matches in
+        its own range however far into the result set it is. An empty page
+        means the end.
+        """
+        db = self._sync()
+        last = db.execute("SELECT max(id) FROM docs").fetchone()[0] or 0
+        rows, span = [], limit
+        while len(rows) < limit and after < last:
+            params, upto = [], min(after + span, last)
+            ids = f"SELECT DISTINCT doc_id FROM ({self._expr(dataset, search_query.strip(), params, after, upto)}) ORDER BY doc_id LIMIT ?"
+            found = db.execute(f"SELECT id, doc FROM docs WHERE id IN ({ids}) ORDER BY id", [*params, limit - len(rows)]).fetchall()
+            rows += found
+            after = found[-1][0] if len(rows) == limit else upto
+            span *= 2
+        return [loads(doc) for _, doc in rows], after
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m local_index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ingest", help="build the index from openFDA bulk download files")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--db", default=os.getenv("LOCAL_INDEX_PATH", "drug_index.db"))
+    p.add_argument("--dataset", choices=sorted(DATASETS), help="dataset of all files (default: guess from file name)")
+    p = sub.add_parser("refresh", help="apply changed bulk partitions to an existing index without a rebuild")
+    p.add_argument("files", nargs="+", help="the complete current partition list of each dataset to refresh")
+    p.add_argument("--db", default=os.getenv("LOCAL_INDEX_PATH", "drug_index.db"))
+    p.add_argument("--dataset", choices=sorted(DATASETS), help="dataset of all files (default: guess from file name)")
+    args = parser.parse_args(argv)
+    if args.command == "ingest":
+        ingest(args.db, args.files, args.dataset)
+    elif args.command == "refresh":
+        refresh(args.db, args.files, args.dataset)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
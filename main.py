@@ -1,379 +1,718 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import inspect
+import logging
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 import httpx
 
-app = FastAPI(title="FDA Drug Search API - COMPLETE")
+import batch
+import export
+import metrics
+import projection
+import registry
+import scheduler
+import suggest
+from cache import ResponseCache, dataset_of, dumps
+from label_text import LabelTextIndex
+from local_index import LocalIndex, values_at
+
+OPENFDA_BASE_URL = os.getenv("OPENFDA_BASE_URL", "https://api.fda.gov").rstrip("/")
+DRUGSFDA_URL = f"{OPENFDA_BASE_URL}/drug/drugsfda.json"
+NDC_URL = f"{OPENFDA_BASE_URL}/drug/ndc.json"
+LABEL_URL = f"{OPENFDA_BASE_URL}/drug/label.json"
+OPENFDA_API_KEY = os.getenv("OPENFDA_API_KEY", "")
+
+# ==================== UPSTREAM HTTP CLIENT ====================
+HTTP_TIMEOUT = float(os.getenv("OPENFDA_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("OPENFDA_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("OPENFDA_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OPENFDA_KEEPALIVE_EXPIRY", "30"))
+HTTP_PER_HOST_CONCURRENCY = int(os.getenv("OPENFDA_PER_HOST_CONCURRENCY", "20"))
+HTTP2 = os.getenv("OPENFDA_HTTP2", "0").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_host_slots = {}
+
+def build_client():
+    http2 = HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401  (httpx needs it for HTTP/2)
+        except ImportError:
+            logger.warning("OPENFDA_HTTP2 is set but the h2 package is not installed; using HTTP/1.1 (pip install 'httpx[http2]')")
+            http2 = False
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE, keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+    return httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=limits, http2=http2)
+
+def get_client():
+    # Created lazily so search_endpoint also works outside the app lifespan (scripts, benchmarks).
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _host_slots.clear()
+
+def host_slot(url):
+    host = urlsplit(url).netloc
+    if host not in _host_slots:
+        _host_slots[host] = asyncio.Semaphore(HTTP_PER_HOST_CONCURRENCY)
+    return _host_slots[host]
+
+# Every upstream call goes through one scheduler sized to the openFDA quota (see scheduler.py).
+upstream_scheduler = scheduler.Scheduler.from_env()
+
+# ==================== RESPONSE CACHE ====================
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+response_cache = ResponseCache.from_env() if CACHE_ENABLED else None
+
+# ==================== LOCAL INDEX BACKEND ====================
+# DATA_BACKEND=local answers every search_endpoint call from the index built by `python -m local_index ingest`.
+DATA_BACKEND = os.getenv("DATA_BACKEND", "openfda").lower()
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "drug_index.db")
+local_index = LocalIndex(LOCAL_INDEX_PATH) if DATA_BACKEND == "local" else None
+
+def search_local(url, search_query, limit=10):
+    try:
+        return local_index.search(dataset_of(url), search_query, min(limit, 99))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ==================== LABEL TEXT INDEX ====================
+# Ranked full-text search over label sections (`python -m label_text`). Labels fetched from openFDA are added as they arrive.
+LABEL_TEXT_INDEX = os.getenv("LABEL_TEXT_INDEX", "")
+LABEL_TEXT_MMAP_MB = int(os.getenv("LABEL_TEXT_MMAP_MB", "1024"))
+LABEL_TEXT_CANDIDATES = int(os.getenv("LABEL_TEXT_CANDIDATES", "2000"))
+label_text_index = LabelTextIndex(LABEL_TEXT_INDEX, LABEL_TEXT_MMAP_MB << 20, LABEL_TEXT_CANDIDATES) if LABEL_TEXT_INDEX else None
+
+# ==================== METRICS ====================
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+METRICS_MAX_FIELDS = int(os.getenv("METRICS_MAX_FIELDS", "200"))
+
+tracer = metrics.Tracer(TRACE_SAMPLE_RATE, TRACE_SLOW_MS, int(os.getenv("TRACE_KEEP", "100")))
+http_latency = metrics.histogram("http_request_duration_seconds", "Time to response headers by route template.", ["route", "method", "status"])
+upstream_latency = metrics.histogram("upstream_request_duration_seconds", "openFDA call time including queueing and retries.", ["dataset", "field"])
+upstream_responses = metrics.counter("upstream_responses_total", "openFDA responses by status; 404s are served as empty results.", ["dataset", "status", "outcome"])
+upstream_bytes = metrics.counter("upstream_received_bytes_total", "Response body bytes received from openFDA.", ["dataset"])
+upstream_in_flight = metrics.gauge("upstream_in_flight_requests", "openFDA requests currently holding a connection.", ["host"])
+fanout_fields = metrics.counter("fanout_fields_total", "Per-field queries of search/all fan-outs by outcome.", ["dataset", "outcome"])
+_metric_fields = set()
+
+def query_field(url, params):
+    """The field a query filters on, as a metric label; new fields past METRICS_MAX_FIELDS count as "other"."""
+    if params is None:
+        params = dict(httpx.URL(url).params)
+    if "count" in params:
+        return "count"
+    match = re.match(r"\(?([\w.]+):", params.get("search", ""))
+    if not match:
+        return "none"
+    field = match.group(1)
+    if field not in _metric_fields:
+        if len(_metric_fields) >= METRICS_MAX_FIELDS:
+            return "other"
+        _metric_fields.add(field)
+    return field
+
+# ==================== TYPEAHEAD ====================
+# Names ranked by NDC product count, from the local index or openFDA's count endpoint (top 1000 per field).
+SUGGEST_FIELDS = {"brand": "brand_name", "generic": "generic_name", "substance": "active_ingredients.name", "manufacturer": "labeler_name"}
+SUGGEST_SNAPSHOT = os.getenv("SUGGEST_SNAPSHOT", "")
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "86400"))
+
+def count_local_names():
+    counts = {}
+    for doc in local_index.iter_docs("ndc"):
+        for kind, field in SUGGEST_FIELDS.items():
+            for name in set(values_at(doc, field)):
+                counts[(name, kind)] = counts.get((name, kind), 0) + 1
+    return [(name, kind, n) for (name, kind), n in counts.items()]
+
+async def load_suggestions():
+    if local_index:
+        return await asyncio.to_thread(count_local_names)
+    entries = []
+    for kind, field in SUGGEST_FIELDS.items():
+        data, _ = await fetch_page(NDC_URL, {"count": f"{field}.exact", "limit": 1000})
+        entries.extend((r["term"], kind, r["count"]) for r in data.get("results", []))
+    return entries
+
+suggester = suggest.Suggester(load_suggestions, SUGGEST_SNAPSHOT or None, SUGGEST_REFRESH_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app):
+    get_client()
+    suggester.start()
+    yield
+    await suggester.stop()
+    await close_client()
+    if response_cache:
+        response_cache.close()
+    if local_index:
+        local_index.close()
+    if label_text_index:
+        label_text_index.close()
+
+app = FastAPI(title="FDA Drug Search API - COMPLETE", lifespan=lifespan)
 
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
-DRUGSFDA_URL = "https://api.fda.gov/drug/drugsfda.json"
-NDC_URL = "https://api.fda.gov/drug/ndc.json"
-LABEL_URL = "https://api.fda.gov/drug/label.json"
+@app.middleware("http")
+async def upstream_priority(request: Request, call_next):
+    # Batch and export jobs queue behind interactive lookups; clients can also ask with X-Request-Priority.
+    name = request.headers.get("x-request-priority", "").lower()
+    if name not in scheduler.PRIORITIES:
+        name = "batch" if request.url.path.endswith(("/batch", "/export")) else "interactive"
+    scheduler.request_priority.set(scheduler.PRIORITIES[name])
+    return await call_next(request)
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    started, status = asyncio.get_running_loop().time(), 500
+    try:
+        with tracer.request(request.method, request.url.path):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_latency.observe(asyncio.get_running_loop().time() - started, route=route.path if route else "unmatched",
+                             method=request.method, status=status)
 
 @app.get("/")
 async def read_root():
     return FileResponse("static/index.html")
 
-async def search_endpoint(url, search_query, limit=10):
+def checked_query(build, *args):
+    """Run a registry query builder, turning invalid input into a 400."""
     try:
-        params = {"search": search_query, "limit": min(limit, 99)}
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, params=params)
+        return build(*args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def search_endpoint(url, search_query, limit=10):
+    with metrics.span("search", dataset=dataset_of(url), query=search_query):
+        if local_index:
+            return await asyncio.to_thread(search_local, url, search_query, limit)
+        if response_cache:
+            return await response_cache.get_or_fetch(url, search_query, min(limit, 99), fetch_upstream)
+        return await fetch_upstream(url, search_query, limit)
+
+async def fetch_upstream(url, search_query, limit=10):
+    data, _ = await fetch_page(url, {"search": search_query, "limit": min(limit, 99)})
+    return data
+
+async def fetch_page(url, params=None):
+    """One upstream GET; returns (json, next page URL from the Link header or None)."""
+    if OPENFDA_API_KEY:
+        if params is None:
+            url = str(httpx.URL(url).copy_merge_params({"api_key": OPENFDA_API_KEY}))
+        else:
+            params = {**params, "api_key": OPENFDA_API_KEY}
+
+    host = urlsplit(url).netloc
+    dataset = dataset_of(url)
+
+    async def send():
+        async with host_slot(url):
+            upstream_in_flight.inc(host=host)
+            try:
+                response = await get_client().get(url, params=params)
+            finally:
+                upstream_in_flight.dec(host=host)
+            upstream_bytes.inc(len(response.content), dataset=dataset)
+            return response
+
+    with upstream_latency.time(dataset=dataset, field=query_field(url, params)), metrics.span("upstream", dataset=dataset) as span:
+        try:
+            response = await upstream_scheduler.request(send)
+            span["status"] = response.status_code
             response.raise_for_status()
-            return response.json()
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            return {"results": [], "meta": {"results": {"total": 0}}}
-        raise HTTPException(status_code=e.response.status_code, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+            upstream_responses.inc(dataset=dataset, status=response.status_code, outcome="ok")
+            data = response.json()
+            if label_text_index and dataset == "label":
+                label_text_index.submit(data.get("results", []))
+            return data, response.links.get("next", {}).get("url")
+        except scheduler.Overloaded as e:
+            upstream_responses.inc(dataset=dataset, status="shed", outcome="error")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                upstream_responses.inc(dataset=dataset, status=404, outcome="empty")
+                return {"results": [], "meta": {"results": {"total": 0}}}, None
+            upstream_responses.inc(dataset=dataset, status=e.response.status_code, outcome="error")
+            retry_after = e.response.headers.get("retry-after")
+            raise HTTPException(status_code=e.response.status_code, detail=str(e), headers={"Retry-After": retry_after} if retry_after else None)
+        except Exception as e:
+            upstream_responses.inc(dataset=dataset, status=type(e).__name__, outcome="error")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/suggest")
+async def suggest_names(prefix: str, limit: int = Query(10, ge=1, le=50), kinds: str = ""):
+    wanted = {k for k in kinds.split(",") if k} or None
+    return {"results": suggester.search(prefix, limit, wanted), "meta": {"ready": suggester.index is not None}}
+
+@app.get("/api/suggest/stats")
+async def suggest_stats():
+    return suggester.stats()
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return response_cache.stats() if response_cache else {"enabled": False}
+
+@app.get("/api/scheduler/stats")
+async def scheduler_stats():
+    return upstream_scheduler.stats()
+
+metrics.collect("scheduler", "Upstream scheduler stats (see /api/scheduler/stats).", upstream_scheduler.stats)
+if response_cache:
+    metrics.collect("cache", "Response cache stats (see /api/cache/stats).", response_cache.stats)
+if label_text_index:
+    metrics.collect("label_text", "Label text index stats (see /api/label/ranked/stats).", label_text_index.stats)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/traces")
+async def slow_traces(limit: int = 20):
+    return {"results": tracer.recent(limit), "meta": {"sample_rate": tracer.sample_rate, "slow_ms": tracer.slow_ms}}
+
+# ==================== SEARCH-ALL FAN-OUT ====================
+FANOUT_DEADLINE = float(os.getenv("FANOUT_DEADLINE", "10"))
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "6"))
+
+async def search_all(url, fields, query, key, limit, per_field=10, deadline=None):
+    """Query every field concurrently and merge results de-duplicated on `key`.
+
+    Results keep field order, so the output matches a sequential fan-out. Each
+    answer is merged as soon as every field before it has answered, before its
+    FANOUT_CONCURRENCY slot is freed. Once `limit` unique results are merged,
+    fields still waiting for a slot are "skipped" and never reach openFDA, and
+    those already sent but unanswered are "cancelled".
+    """
+    queries = [checked_query(registry.clause, field, query) for field in fields]
+    slots = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    finished = asyncio.Event()
+    pages, sent, all_results, seen = {}, set(), [], set()
+    merged = 0
+
+    def add(page):
+        for r in page.get("results", []):
+            value = r.get(key, "")
+            if value and value not in seen:
+                seen.add(value)
+                all_results.append(r)
+
+    def merge():
+        nonlocal merged
+        while merged in pages and len(all_results) < limit:
+            if not isinstance(pages[merged], HTTPException):
+                add(pages[merged])
+            merged += 1
+        if merged == len(fields) or len(all_results) >= limit:
+            finished.set()
+
+    async def run(i, field, search_query):
+        with metrics.span("fanout", field=field):
+            async with slots:
+                if finished.is_set():
+                    return
+                sent.add(field)
+                try:
+                    pages[i] = await search_endpoint(url, search_query, per_field)
+                except HTTPException as e:
+                    pages[i] = e
+                merge()
+
+    merge()
+    tasks = [asyncio.create_task(run(i, field, q)) for i, (field, q) in enumerate(zip(fields, queries))]
+    try:
+        await asyncio.wait_for(finished.wait(), FANOUT_DEADLINE if deadline is None else deadline)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+    failed, timed_out, cancelled, skipped = [], [], [], []
+    for i, field in enumerate(fields):
+        page = pages.get(i)
+        if isinstance(page, HTTPException):
+            failed.append({"field": field, "status": page.status_code, "detail": page.detail})
+        elif page is not None:
+            if i >= merged and len(all_results) < limit:  # answered after a field that timed out
+                add(page)
+        elif len(all_results) < limit:
+            timed_out.append(field)
+        else:
+            (cancelled if field in sent else skipped).append(field)
+    outcomes = {"failed": failed, "timed_out": timed_out, "cancelled": cancelled, "skipped": skipped}
+    for outcome, names in outcomes.items():
+        fanout_fields.inc(len(names), dataset=dataset_of(url), outcome=outcome)
+    fanout_fields.inc(len(fields) - sum(map(len, outcomes.values())), dataset=dataset_of(url), outcome="ok")
+    meta = {"results": {"total": len(all_results)}, "fields": outcomes}
+    return {"results": all_results[:limit], "meta": meta}
 
 # ==================== DRUGSFDA ENDPOINTS ====================
 @app.get("/api/drugsfda/search/all")
 async def drugsfda_search_all(query: str, limit: int = 20):
     fields = ["openfda.brand_name", "openfda.generic_name", "openfda.manufacturer_name", "openfda.substance_name", "application_number"]
-    all_results, seen = [], set()
-    for field in fields:
-        try:
-            data = await search_endpoint(DRUGSFDA_URL, f"{field}:{query}", 10)
-            for r in data.get("results", []):
-                app_num = r.get("application_number", "")
-                if app_num and app_num not in seen:
-                    seen.add(app_num)
-                    all_results.append(r)
-        except: pass
-    return {"results": all_results[:limit], "meta": {"results": {"total": len(all_results)}}}
+    return await search_all(DRUGSFDA_URL, fields, query, "application_number", limit)
 
 @app.get("/api/drugsfda/search")
 async def drugsfda_search(query: str, field: str = "openfda.brand_name", limit: int = 10):
-    return await search_endpoint(DRUGSFDA_URL, f"{field}:{query}", limit)
+    allowed = registry.query_fields("drugsfda")
+    if field not in allowed:
+        raise HTTPException(status_code=400, detail=f"unknown field {field!r} for drugsfda; searchable fields: {', '.join(allowed)}")
+    return await search_endpoint(DRUGSFDA_URL, checked_query(registry.clause, field, query), limit)
 
 # ==================== NDC ENDPOINTS - ALL FIELDS ====================
 @app.get("/api/ndc/search/all")
 async def ndc_search_all(query: str, limit: int = 20):
     fields = ["brand_name", "generic_name", "openfda.manufacturer_name", "product_ndc", "dosage_form", "route"]
-    all_results, seen = [], set()
-    for field in fields:
-        try:
-            data = await search_endpoint(NDC_URL, f"{field}:{query}", 10)
-            for r in data.get("results", []):
-                pid = r.get("product_id", "")
-                if pid and pid not in seen:
-                    seen.add(pid)
-                    all_results.append(r)
-        except: pass
-    return {"results": all_results[:limit], "meta": {"results": {"total": len(all_results)}}}
-
-@app.get("/api/ndc/brand-name")
-async def ndc_brand_name(name: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"brand_name:{name}", limit)
-
-@app.get("/api/ndc/generic-name")
-async def ndc_generic_name(name: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"generic_name:{name}", limit)
-
-@app.get("/api/ndc/product-ndc")
-async def ndc_product_ndc(ndc: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"product_ndc:{ndc}", limit)
-
-@app.get("/api/ndc/package-ndc")
-async def ndc_package_ndc(ndc: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"packaging.package_ndc:{ndc}", limit)
-
-@app.get("/api/ndc/dosage-form")
-async def ndc_dosage_form(form: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"dosage_form:{form}", limit)
-
-@app.get("/api/ndc/route")
-async def ndc_route(route: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"route:{route}", limit)
-
-@app.get("/api/ndc/manufacturer")
-async def ndc_manufacturer(name: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"openfda.manufacturer_name:{name}", limit)
-
-@app.get("/api/ndc/product-type")
-async def ndc_product_type(type: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"product_type:{type}", limit)
-
-@app.get("/api/ndc/finished")
-async def ndc_finished(finished: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"finished:{finished}", limit)
-
-@app.get("/api/ndc/marketing-category")
-async def ndc_marketing_category(category: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"marketing_category:{category}", limit)
-
-@app.get("/api/ndc/application-number")
-async def ndc_application_number(number: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"application_number:{number}", limit)
-
-@app.get("/api/ndc/dea-schedule")
-async def ndc_dea_schedule(schedule: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"dea_schedule:{schedule}", limit)
+    return await search_all(NDC_URL, fields, query, "product_id", limit)
 
 @app.get("/api/ndc/pharm-class")
 async def ndc_pharm_class(class_name: str, class_type: str = "epc", limit: int = 10):
     field_map = {"epc": "openfda.pharm_class_epc", "pe": "openfda.pharm_class_pe", "moa": "openfda.pharm_class_moa", "cs": "openfda.pharm_class_cs"}
     field = field_map.get(class_type.lower(), "openfda.pharm_class_epc")
-    return await search_endpoint(NDC_URL, f"{field}:{class_name}", limit)
-
-@app.get("/api/ndc/active-ingredient")
-async def ndc_active_ingredient(name: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"active_ingredients.name:{name}", limit)
-
-@app.get("/api/ndc/rxcui")
-async def ndc_rxcui(rxcui: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"openfda.rxcui:{rxcui}", limit)
-
-@app.get("/api/ndc/unii")
-async def ndc_unii(unii: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"openfda.unii:{unii}", limit)
-
-@app.get("/api/ndc/spl-id")
-async def ndc_spl_id(spl_id: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"spl_id:{spl_id}", limit)
+    return await search_endpoint(NDC_URL, checked_query(registry.clause, field, class_name), limit)
+
+# Batch lookup: identifiers are normalized and resolved in grouped OR queries, streamed back as NDJSON.
+BATCH_MAX_IDENTIFIERS = int(os.getenv("BATCH_MAX_IDENTIFIERS", "10000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_QUERY_CHARS = int(os.getenv("BATCH_MAX_QUERY_CHARS", "1500"))
+
+class NDCBatch(BaseModel):
+    identifiers: list[str] = []  # type detected per value
+    package_ndc: list[str] = []
+    product_ndc: list[str] = []
+    rxcui: list[str] = []
+    unii: list[str] = []
+
+@app.post("/api/ndc/batch")
+async def ndc_batch(body: NDCBatch):
+    typed = [(v, None) for v in body.identifiers] + [(v, kind) for kind in batch.FIELDS for v in getattr(body, kind)]
+    if len(typed) > BATCH_MAX_IDENTIFIERS:
+        raise HTTPException(status_code=413, detail=f"at most {BATCH_MAX_IDENTIFIERS} identifiers per batch")
+    items, invalid, seen = [], [], set()
+    for value, kind in typed:
+        try:
+            kind, terms = batch.normalize(value, kind)
+        except ValueError as e:
+            invalid.append({"input": value, "type": kind, "error": str(e), "status": 400})
+            continue
+        if (value, kind) not in seen:
+            seen.add((value, kind))
+            items.append((value, kind, terms))
+
+    async def lines():
+        for line in invalid:
+            yield dumps(line) + b"\n"
+        async for line in batch.resolve(search_endpoint, NDC_URL, items, BATCH_CONCURRENCY, BATCH_MAX_QUERY_CHARS):
+            yield dumps(line) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-@app.get("/api/ndc/spl-set-id")
-async def ndc_spl_set_id(spl_set_id: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"openfda.spl_set_id:{spl_set_id}", limit)
+# ==================== DRUG LABEL ENDPOINTS - ALL FIELDS ====================
+# Label documents are large: routes return only `fields` (default: identifiers plus the route's own
+# section) and can cut sections to `max_chars` around the match.
+class LabelView:
+    def __init__(self, fields: str = "", max_chars: int | None = Query(None, ge=1)):
+        self.fields = projection.parse_fields(fields)
+        self.max_chars = max_chars
 
-@app.get("/api/ndc/upc")
-async def ndc_upc(upc: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"openfda.upc:{upc}", limit)
+def label_response(data, view, sections, query=None):
+    fields = view.fields or projection.default_fields(sections)
+    return projection.FastJSONResponse(projection.project(data, fields, view.max_chars, query))
 
-@app.get("/api/ndc/original-packager")
-async def ndc_original_packager(is_original: str, limit: int = 10):
-    return await search_endpoint(NDC_URL, f"openfda.is_original_packager:{is_original}", limit)
+async def label_search(search_query, limit, view, sections, query=None):
+    return label_response(await search_endpoint(LABEL_URL, search_query, limit), view, sections, query)
 
-# ==================== DRUG LABEL ENDPOINTS - ALL FIELDS ====================
 @app.get("/api/label/search/all")
-async def label_search_all(query: str, limit: int = 20):
+async def label_search_all(query: str, limit: int = 20, view: LabelView = Depends()):
     fields = ["openfda.brand_name", "openfda.generic_name", "indications_and_usage", "warnings"]
-    all_results, seen = [], set()
-    for field in fields:
-        try:
-            data = await search_endpoint(LABEL_URL, f"{field}:{query}", 10)
-            for r in data.get("results", []):
-                sid = r.get("set_id", "")
-                if sid and sid not in seen:
-                    seen.add(sid)
-                    all_results.append(r)
-        except: pass
-    return {"results": all_results[:limit], "meta": {"results": {"total": len(all_results)}}}
-
-# Basic searches
-@app.get("/api/label/brand-name")
-async def label_brand_name(name: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"openfda.brand_name:{name}", limit)
-
-@app.get("/api/label/generic-name")
-async def label_generic_name(name: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"openfda.generic_name:{name}", limit)
-
-@app.get("/api/label/manufacturer")
-async def label_manufacturer(name: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"openfda.manufacturer_name:{name}", limit)
-
-@app.get("/api/label/substance-name")
-async def label_substance_name(name: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"openfda.substance_name:{name}", limit)
-
-@app.get("/api/label/route")
-async def label_route(route: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"openfda.route:{route}", limit)
-
-@app.get("/api/label/product-type")
-async def label_product_type(type: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"openfda.product_type:{type}", limit)
-
-# Abuse and overdosage
-@app.get("/api/label/abuse")
-async def label_abuse(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"abuse:{query}", limit)
-
-@app.get("/api/label/controlled-substance")
-async def label_controlled_substance(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"controlled_substance:{query}", limit)
-
-@app.get("/api/label/dependence")
-async def label_dependence(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"dependence:{query}", limit)
-
-@app.get("/api/label/overdosage")
-async def label_overdosage(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"overdosage:{query}", limit)
-
-# Adverse effects and interactions
-@app.get("/api/label/adverse-reactions")
-async def label_adverse_reactions(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"adverse_reactions:{query}", limit)
-
-@app.get("/api/label/drug-interactions")
-async def label_drug_interactions(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"drug_interactions:{query}", limit)
-
-@app.get("/api/label/laboratory-test-interactions")
-async def label_lab_test_interactions(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"drug_and_or_laboratory_test_interactions:{query}", limit)
-
-# Clinical pharmacology
-@app.get("/api/label/clinical-pharmacology")
-async def label_clinical_pharmacology(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"clinical_pharmacology:{query}", limit)
-
-@app.get("/api/label/mechanism-of-action")
-async def label_mechanism_of_action(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"mechanism_of_action:{query}", limit)
-
-@app.get("/api/label/pharmacodynamics")
-async def label_pharmacodynamics(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"pharmacodynamics:{query}", limit)
-
-@app.get("/api/label/pharmacokinetics")
-async def label_pharmacokinetics(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"pharmacokinetics:{query}", limit)
-
-# Indications, usage, and dosage
-@app.get("/api/label/indications-and-usage")
-async def label_indications(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"indications_and_usage:{query}", limit)
-
-@app.get("/api/label/contraindications")
-async def label_contraindications(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"contraindications:{query}", limit)
-
-@app.get("/api/label/description")
-async def label_description(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"description:{query}", limit)
-
-@app.get("/api/label/dosage-and-administration")
-async def label_dosage(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"dosage_and_administration:{query}", limit)
-
-@app.get("/api/label/dosage-forms-and-strengths")
-async def label_dosage_forms(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"dosage_forms_and_strengths:{query}", limit)
-
-@app.get("/api/label/active-ingredient")
-async def label_active_ingredient(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"active_ingredient:{query}", limit)
-
-@app.get("/api/label/inactive-ingredient")
-async def label_inactive_ingredient(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"inactive_ingredient:{query}", limit)
-
-@app.get("/api/label/purpose")
-async def label_purpose(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"purpose:{query}", limit)
-
-# Nonclinical toxicology
-@app.get("/api/label/animal-pharmacology-toxicology")
-async def label_animal_pharmacology(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"animal_pharmacology_and_or_toxicology:{query}", limit)
-
-@app.get("/api/label/carcinogenesis-mutagenesis-fertility")
-async def label_carcinogenesis(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"carcinogenesis_and_mutagenesis_and_impairment_of_fertility:{query}", limit)
-
-@app.get("/api/label/nonclinical-toxicology")
-async def label_nonclinical_toxicology(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"nonclinical_toxicology:{query}", limit)
-
-# Patient information
-@app.get("/api/label/ask-doctor")
-async def label_ask_doctor(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"ask_doctor:{query}", limit)
-
-@app.get("/api/label/do-not-use")
-async def label_do_not_use(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"do_not_use:{query}", limit)
-
-@app.get("/api/label/information-for-patients")
-async def label_info_for_patients(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"information_for_patients:{query}", limit)
-
-@app.get("/api/label/instructions-for-use")
-async def label_instructions_for_use(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"instructions_for_use:{query}", limit)
-
-@app.get("/api/label/keep-out-of-reach")
-async def label_keep_out_of_reach(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"keep_out_of_reach_of_children:{query}", limit)
-
-@app.get("/api/label/stop-use")
-async def label_stop_use(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"stop_use:{query}", limit)
-
-@app.get("/api/label/when-using")
-async def label_when_using(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"when_using:{query}", limit)
-
-# References
-@app.get("/api/label/clinical-studies")
-async def label_clinical_studies(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"clinical_studies:{query}", limit)
-
-@app.get("/api/label/references")
-async def label_references(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"references:{query}", limit)
-
-# Special populations
-@app.get("/api/label/geriatric-use")
-async def label_geriatric_use(limit: int = 10):
-    return await search_endpoint(LABEL_URL, "_exists_:geriatric_use", limit)
-
-@app.get("/api/label/labor-and-delivery")
-async def label_labor_delivery(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"labor_and_delivery:{query}", limit)
-
-@app.get("/api/label/nursing-mothers")
-async def label_nursing_mothers(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"nursing_mothers:{query}", limit)
-
-@app.get("/api/label/pediatric-use")
-async def label_pediatric_use(limit: int = 10):
-    return await search_endpoint(LABEL_URL, "_exists_:pediatric_use", limit)
-
-@app.get("/api/label/pregnancy")
-async def label_pregnancy(limit: int = 10):
-    return await search_endpoint(LABEL_URL, "_exists_:pregnancy", limit)
-
-@app.get("/api/label/teratogenic-effects")
-async def label_teratogenic_effects(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"teratogenic_effects:{query}", limit)
-
-# Supply, storage, and handling
-@app.get("/api/label/how-supplied")
-async def label_how_supplied(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"how_supplied:{query}", limit)
-
-@app.get("/api/label/storage-and-handling")
-async def label_storage_handling(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"storage_and_handling:{query}", limit)
-
-# Warnings and precautions
-@app.get("/api/label/boxed-warning")
-async def label_boxed_warning(limit: int = 10):
-    return await search_endpoint(LABEL_URL, "_exists_:boxed_warning", limit)
-
-@app.get("/api/label/warnings")
-async def label_warnings(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"warnings:{query}", limit)
-
-@app.get("/api/label/precautions")
-async def label_precautions(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"precautions:{query}", limit)
-
-@app.get("/api/label/user-safety-warnings")
-async def label_user_safety_warnings(query: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"user_safety_warnings:{query}", limit)
+    return label_response(await search_all(LABEL_URL, fields, query, "set_id", limit), view, projection.LABEL_SUMMARY, query)
 
 # Date range
 @app.get("/api/label/date-range")
-async def label_date_range(start_date: str, end_date: str, limit: int = 10):
-    return await search_endpoint(LABEL_URL, f"effective_time:[{start_date}+TO+{end_date}]", limit)
+async def label_date_range(start_date: str, end_date: str, limit: int = 10, view: LabelView = Depends()):
+    search_query = checked_query(registry.range_clause, "effective_time", start_date, end_date)
+    return await label_search(search_query, limit, view, projection.LABEL_SUMMARY)
+
+# Ranked full-text search, answered from the label text index without calling openFDA
+@app.get("/api/label/ranked")
+async def label_ranked(q: str, limit: int = 10, sections: str = "", view: LabelView = Depends()):
+    if not label_text_index:
+        raise HTTPException(status_code=503, detail="label text index not configured (set LABEL_TEXT_INDEX)")
+    wanted = [s for s in sections.split(",") if s] or None
+    try:
+        data = await asyncio.to_thread(label_text_index.search, q, min(limit, 100), wanted)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    hits = data.pop("results")
+    data["results"] = [hit["doc"] for hit in hits]
+    fields = view.fields or projection.default_fields(projection.LABEL_SUMMARY)
+    data = projection.project(data, fields, view.max_chars, q)
+    for doc, hit in zip(data["results"], hits):
+        doc["_score"], doc["_match"], doc["_highlights"] = hit["score"], hit["match"], hit["highlights"]
+    return projection.FastJSONResponse(data)
+
+@app.get("/api/label/ranked/stats")
+async def label_ranked_stats():
+    return label_text_index.stats() if label_text_index else {"enabled": False}
+
+# ==================== FIELD ROUTES ====================
+# One GET route per registry.FIELDS entry, plus /api/{dataset}/query combining several field filters.
+DATASET_URLS = {"drugsfda": DRUGSFDA_URL, "ndc": NDC_URL, "label": LABEL_URL}
+QUERY_MAX_CHARS = int(os.getenv("QUERY_MAX_CHARS", "500"))
+QUERY_RESERVED = {"op", "exists", "limit", "fields", "max_chars"}
+
+def with_signature(endpoint, name, params):
+    # FastAPI reads parameters (and so validation and OpenAPI docs) from __signature__.
+    endpoint.__name__ = name
+    endpoint.__signature__ = inspect.Signature([inspect.Parameter(n, inspect.Parameter.KEYWORD_ONLY, default=d, annotation=a)
+                                                for n, a, d in params])
+    return endpoint
+
+def label_sections(paths):
+    """Sections a label response keeps by default: the searched ones, or the summary for identifier searches."""
+    return [p for p in paths if not p.startswith("openfda.") and p not in projection.LABEL_IDENTIFIERS] or projection.LABEL_SUMMARY
+
+def field_route(spec):
+    url = DATASET_URLS[spec.dataset]
+
+    async def endpoint(limit=10, view=None, **values):
+        value = None if spec.exists else values[spec.param]
+        search_query = registry.exists(spec.path) if spec.exists else checked_query(registry.clause, spec.path, value)
+        if spec.dataset != "label":
+            return await search_endpoint(url, search_query, limit)
+        sections = label_sections([spec.path])
+        return await label_search(search_query, limit, view, sections, value if sections != projection.LABEL_SUMMARY else None)
+
+    params = [] if spec.exists else [(spec.param, str, Query(min_length=1, max_length=QUERY_MAX_CHARS))]
+    params.append(("limit", int, 10))
+    if spec.dataset == "label":
+        params.append(("view", LabelView, Depends()))
+    return with_signature(endpoint, f"{spec.dataset}_{spec.route.replace('-', '_')}", params)
+
+def dataset_query_route(dataset):
+    url, allowed = DATASET_URLS[dataset], registry.query_fields(dataset)
+
+    async def endpoint(request, op="and", exists="", limit=10, view=None):
+        filters = {}
+        for key, value in request.query_params.multi_items():
+            if key in QUERY_RESERVED:
+                continue
+            if key not in allowed:
+                raise HTTPException(status_code=400, detail=f"unknown filter {key!r} for {dataset}; filterable fields: {', '.join(allowed)}")
+            if len(value) > QUERY_MAX_CHARS:
+                raise HTTPException(status_code=400, detail=f"filter {key!r} is longer than {QUERY_MAX_CHARS} characters")
+            filters.setdefault(key, []).append(value)
+        required = projection.parse_fields(exists)
+        unknown = [p for p in required if p not in allowed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"unknown exists field(s) for {dataset}: {', '.join(unknown)}")
+        if not filters and not required:
+            raise HTTPException(status_code=400, detail="give at least one field filter or `exists` field")
+        clauses = [checked_query(registry.any_of, path, values) for path, values in filters.items()]
+        search_query = checked_query(registry.combine, clauses + [registry.exists(p) for p in required], op)
+        data = await search_endpoint(url, search_query, limit)
+        data = {**data, "meta": {**data.get("meta", {}), "search": search_query}}
+        if dataset != "label":
+            return data
+        sections = label_sections(list(filters) + required)
+        terms = " ".join(v for path, values in filters.items() if path in sections for v in values)
+        return label_response(data, view, sections, terms or None)
+
+    params = [("request", Request, inspect.Parameter.empty), ("op", str, "and"),
+              ("exists", str, ""), ("limit", int, 10)]
+    if dataset == "label":
+        params.append(("view", LabelView, Depends()))
+    return with_signature(endpoint, f"{dataset}_query", params)
+
+for spec in registry.FIELDS:
+    app.add_api_route(f"/api/{spec.dataset}/{spec.route}", field_route(spec), methods=["GET"])
+for dataset in DATASET_URLS:
+    app.add_api_route(f"/api/{dataset}/query", dataset_query_route(dataset), methods=["GET"])
+
+# ==================== DRUG PROFILE ====================
+# How each identifier type is referenced in each dataset (openFDA's `openfda` cross-reference keys).
+PROFILE_SOURCES = {"drugsfda": DRUGSFDA_URL, "ndc": NDC_URL, "label": LABEL_URL}
+PROFILE_KEYS = {
+    "application_number": {"drugsfda": "application_number", "ndc": "application_number", "label": "openfda.application_number"},
+    "product_ndc": {"drugsfda": "openfda.product_ndc", "ndc": "product_ndc", "label": "openfda.product_ndc"},
+    "package_ndc": {"drugsfda": "openfda.package_ndc", "ndc": "packaging.package_ndc", "label": "openfda.package_ndc"},
+    "rxcui": {"drugsfda": "openfda.rxcui", "ndc": "openfda.rxcui", "label": "openfda.rxcui"},
+    "set_id": {"drugsfda": "openfda.spl_set_id", "ndc": "openfda.spl_set_id", "label": "set_id"},
+}
+# When a source finds nothing for the identifier itself, follow links from the records the others found.
+PROFILE_LINKS = {
+    "drugsfda": ("application_number", ["ndc:application_number", "label:openfda.application_number"]),
+    "ndc": ("product_ndc", ["label:openfda.product_ndc", "drugsfda:openfda.product_ndc"]),
+    "label": ("set_id", ["ndc:openfda.spl_set_id", "drugsfda:openfda.spl_set_id"]),
+}
+# Record identity per source, to merge the answers of a lookup split across queries.
+PROFILE_IDS = {"drugsfda": "application_number", "ndc": "product_id", "label": "id"}
+APPLICATION_NUMBER = re.compile(r"^(NDA|ANDA|BLA)\d+$", re.IGNORECASE)
+SET_ID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE)
+
+def profile_identifier(value):
+    value = value.strip()
+    if APPLICATION_NUMBER.match(value):
+        return "application_number", [value.upper()]
+    if SET_ID.match(value):
+        return "set_id", [value.lower()]
+    try:
+        kind, terms = batch.normalize(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if kind not in PROFILE_KEYS:
+        raise HTTPException(status_code=400, detail=f"{kind} identifiers are not supported for profiles")
+    return kind, terms
+
+@app.get("/api/drug/{identifier}")
+async def drug_profile(identifier: str, limit: int = 20, view: LabelView = Depends()):
+    kind, terms = profile_identifier(identifier)
+    sources = {name: {"queries": [], "ms": 0.0, "failed": []} for name in PROFILE_SOURCES}
+    found = {name: [] for name in PROFILE_SOURCES}
+    lookups = {}
+
+    def lookup(name, field, values):
+        # Queries within BATCH_MAX_QUERY_CHARS, one task per distinct query, shared by everything in this profile that needs it.
+        tasks = []
+        for chunk in batch.split_terms(field, values, BATCH_MAX_QUERY_CHARS):
+            query = batch.build_query(field, chunk)
+            if (name, query) not in lookups:
+                lookups[(name, query)] = asyncio.create_task(timed_lookup(name, query))
+            tasks.append(lookups[(name, query)])
+        return tasks
+
+    async def results(name, tasks):
+        merged = {}
+        for task in tasks:
+            for r in await task:
+                merged.setdefault(r.get(PROFILE_IDS[name]) or len(merged), r)
+        return list(merged.values())[:limit]
+
+    async def timed_lookup(name, query):
+        started = time.perf_counter()
+        try:
+            return (await search_endpoint(PROFILE_SOURCES[name], query, limit)).get("results", [])
+        except HTTPException as e:
+            sources[name]["failed"].append({"query": query, "status": e.status_code, "detail": e.detail})
+            return []
+        finally:
+            sources[name]["queries"].append(query)
+            sources[name]["ms"] += (time.perf_counter() - started) * 1000
+
+    first = {name: lookup(name, PROFILE_KEYS[kind][name], terms) for name in PROFILE_SOURCES}
+    for name, tasks in first.items():
+        found[name] = await results(name, tasks)
+    follow = {}
+    for name, (field, links) in PROFILE_LINKS.items():
+        if found[name]:
+            continue
+        values = []
+        for link in links:
+            other, path = link.split(":")
+            values.extend(v for r in found[other] for v in values_at(r, path))
+        if values:
+            follow[name] = lookup(name, field, list(dict.fromkeys(values)))
+    for name, tasks in follow.items():
+        found[name] = await results(name, tasks)
+
+    fields = view.fields or projection.default_fields(projection.LABEL_SUMMARY)
+    label = projection.project({"results": found["label"]}, fields, view.max_chars)["results"]
+    for name in sources:
+        sources[name]["ms"] = round(sources[name]["ms"], 1)
+        sources[name]["results"] = len(found[name])
+    return projection.FastJSONResponse({
+        "identifier": {"value": identifier, "type": kind, "forms": terms},
+        "drugsfda": found["drugsfda"], "ndc": found["ndc"], "label": label,
+        "meta": {"sources": sources, "upstream_queries": len(lookups)},
+    })
+
+# ==================== EXPORT ====================
+# Pages past the 99-result cap: openFDA's Link/search_after when offered, skip otherwise (openFDA caps skip at 25000).
+# The local index pages by doc id, off the event loop.
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+EXPORT_PREFETCH = int(os.getenv("EXPORT_PREFETCH", "2"))
+EXPORT_MAX_SKIP = 25000
+
+async def iter_pages(url, search_query, page_size=EXPORT_PAGE_SIZE):
+    if local_index:
+        after = 0
+        while True:
+            try:
+                results, after = await asyncio.to_thread(local_index.search_after, dataset_of(url), search_query, page_size, after)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if not results:
+                return
+            yield results
+    params, next_url, skip = {"search": search_query, "limit": page_size}, None, 0
+    while True:
+        data, link = await fetch_page(next_url or url, None if next_url else params)
+        results = data.get("results", [])
+        if not results:
+            return
+        yield results
+        skip += len(results)
+        if link:
+            next_url = link
+        elif skip >= data.get("meta", {}).get("results", {}).get("total", 0) or skip > EXPORT_MAX_SKIP:
+            return
+        else:
+            params["skip"] = skip
+
+async def export_response(url, search, format, fields, max_records):
+    if format not in export.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(export.MEDIA_TYPES)}")
+    columns = fields.split(",") if fields else export.CSV_COLUMNS[dataset_of(url)]
+    pages = export.prefetch(iter_pages(url, search), EXPORT_PREFETCH)
+    # Pull the first page before answering so bad queries still get a proper error status.
+    try:
+        first = await anext(pages)
+    except StopAsyncIteration:
+        first = []
+
+    async def all_pages():
+        yield first
+        async for page in pages:
+            yield page
+
+    body = export.encode(export.limited(all_pages(), max_records), format, columns)
+    filename = f"{dataset_of(url)}-export.{format}"
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/api/drugsfda/export")
+async def drugsfda_export(search: str, format: str = "ndjson", fields: str = "", max_records: int | None = Query(None, ge=1)):
+    return await export_response(DRUGSFDA_URL, search, format, fields, max_records)
+
+@app.get("/api/ndc/export")
+async def ndc_export(search: str, format: str = "ndjson", fields: str = "", max_records: int | None = Query(None, ge=1)):
+    return await export_response(NDC_URL, search, format, fields, max_records)
+
+@app.get("/api/label/export")
+async def label_export(search: str, format: str = "ndjson", fields: str = "", max_records: int | None = Query(None, ge=1)):
+    return await export_response(LABEL_URL, search, format, fields, max_records)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
\ No newline at end of file
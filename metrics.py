@@ -0,0 +1,184 @@
+"""Prometheus metrics and sampled request traces, without extra dependencies.
+
+Metrics live in one process-wide registry and are rendered in the
+Prometheus text format by `render()`. Collectors registered with
+`collect()` turn stats dicts (cache, scheduler) into gauges at scrape time.
+Under several uvicorn workers each process keeps its own registry.
+
+A sampled request records a span for each search and upstream call. It is
+kept if it ran longer than the slow threshold, so the spans show the
+fan-out waterfall of slow requests.
+"""
+import bisect
+import contextvars
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def label_text(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def lines(self):
+        return [f"{self.name}{label_text(self.labels, k)} {v}" for k, v in sorted(self.series.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        self.series[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def lines(self):
+        out = []
+        for key, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                out.append(f"{self.name}_bucket{label_text(self.labels, key, [('le', bound)])} {cumulative}")
+            out.append(f"{self.name}_sum{label_text(self.labels, key)} {total}")
+            out.append(f"{self.name}_count{label_text(self.labels, key)} {cumulative}")
+        return out
+
+
+_metrics = []
+_collectors = []
+
+
+def register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def counter(name, help, labels=()):
+    return register(Counter(name, help, labels))
+
+
+def gauge(name, help, labels=()):
+    return register(Gauge(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    return register(Histogram(name, help, labels, buckets))
+
+
+def collect(prefix, help, stats):
+    """Export the numeric values of `stats()` as `{prefix}_{key}` gauges on every scrape."""
+    _collectors.append((prefix, help, stats))
+
+
+def render():
+    out = []
+    for metric in _metrics:
+        out += metric.header() + metric.lines()
+    for prefix, help, stats in _collectors:
+        for key, value in stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            out += [f"# HELP {prefix}_{key} {help}", f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {value}"]
+    return "\n".join(out) + "\n"
+
+
+# ==================== TRACES ====================
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Tracer:
+    """Samples `sample_rate` of requests and keeps the last `keep` that took at least `slow_ms`."""
+
+    def __init__(self, sample_rate=0.0, slow_ms=1000.0, keep=100):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.traces = deque(maxlen=keep)
+
+    @contextmanager
+    def request(self, method, path):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            yield None
+            return
+        trace = {"method": method, "path": path, "started": time.time(), "start": time.perf_counter(), "spans": []}
+        token = _trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _trace.reset(token)
+            ms = (time.perf_counter() - trace["start"]) * 1000
+            if ms >= self.slow_ms:
+                self.traces.append({**{k: v for k, v in trace.items() if k != "start"}, "ms": round(ms, 1)})
+
+    def recent(self, limit=20):
+        return list(self.traces)[-limit:][::-1]
+
+
+@contextmanager
+def span(name, **attrs):
+    """Record a span on the current trace; spans started in child tasks land on the same trace."""
+    trace = _trace.get()
+    if trace is None:
+        yield attrs
+        return
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        trace["spans"].append({"name": name, "offset_ms": round((started - trace["start"]) * 1000, 1),
+                               "ms": round((time.perf_counter() - started) * 1000, 1), **attrs})
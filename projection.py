@@ -0,0 +1,97 @@
+"""Field projection and section snippets for label responses.
+
+Label documents carry dozens of long SPL sections; routes keep only the
+fields a caller asked for (or the route's default set) before encoding, and
+can cut long sections down to an excerpt around the matched term.
+"""
+import re
+
+from starlette.responses import Response
+
+from cache import dumps
+
+LABEL_IDENTIFIERS = ["set_id", "id", "version", "effective_time", "openfda.brand_name", "openfda.generic_name",
+                     "openfda.manufacturer_name", "openfda.product_ndc", "openfda.rxcui", "openfda.spl_set_id", "openfda.application_number"]
+# What the label cards in static/index.html render.
+LABEL_SUMMARY = ["indications_and_usage", "warnings", "boxed_warning"]
+ALL = {"*", "all"}
+KEEP = object()
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson when available, skipping FastAPI's jsonable_encoder pass."""
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+def parse_fields(fields):
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+
+
+def default_fields(sections):
+    return LABEL_IDENTIFIERS + [s for s in sections if not s.startswith("openfda.")]
+
+
+def field_tree(paths):
+    """{"openfda": {"brand_name": KEEP}, "set_id": KEEP} from dotted paths; a shorter path wins."""
+    tree = {}
+    for path in paths:
+        node, parts = tree, path.split(".")
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is KEEP:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = KEEP
+    return tree
+
+
+def prune(value, tree):
+    if isinstance(value, list):
+        return [prune(v, tree) for v in value]
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    for key, sub in tree.items():
+        if key in value:
+            out[key] = value[key] if sub is KEEP else prune(value[key], sub)
+    return out
+
+
+def excerpt(text, size, terms):
+    if len(text) <= size:
+        return text
+    start = 0
+    if terms:
+        m = re.search("|".join(map(re.escape, terms)), text, re.IGNORECASE)
+        if m:
+            start = max(0, min(m.start() - size // 3, len(text) - size))
+    return ("…" if start else "") + text[start:start + size] + ("…" if start + size < len(text) else "")
+
+
+def snip(record, size, terms):
+    for key, value in record.items():
+        if key == "openfda" or key in LABEL_IDENTIFIERS:
+            continue
+        if isinstance(value, list):
+            record[key] = [excerpt(v, size, terms) if isinstance(v, str) else v for v in value]
+        elif isinstance(value, str):
+            record[key] = excerpt(value, size, terms)
+    return record
+
+
+def project(data, fields, max_chars=None, query=None):
+    """Copy of an openFDA response with results reduced to `fields`, sections cut to `max_chars`."""
+    results = data.get("results", [])
+    if not set(fields) & ALL:
+        tree = field_tree(fields)
+        results = [prune(r, tree) for r in results]
+    elif max_chars:
+        results = [dict(r) for r in results]
+    if max_chars:
+        terms = re.findall(r"\w+", query or "")
+        results = [snip(r, max_chars, terms) for r in results]
+    return {**data, "results": results}
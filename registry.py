@@ -0,0 +1,141 @@
+"""Field registry for the per-field search routes, and the openFDA query builder.
+
+Each Field is one `/api/{dataset}/{route}` endpoint: the openFDA field path it
+searches and the name of the query parameter carrying the value. main.py
+generates the routes from FIELDS. The generic `/api/{dataset}/query`
+endpoint accepts any registered path of its dataset.
+
+Values are always phrase-quoted with `"` and `\\` escaped. Spaces, `+` and
+query syntax in user input stay inside one term and do not become extra
+clauses. Clauses are joined with spaces, which the HTTP client encodes as `+`.
+"""
+import re
+from typing import NamedTuple
+
+RANGE_BOUND = re.compile(r"^[\w.-]+$")
+
+
+class Field(NamedTuple):
+    dataset: str
+    path: str
+    route: str
+    param: str = "query"
+    exists: bool = False  # route takes no value and matches records that have the field
+
+
+def phrase(value):
+    value = " ".join(str(value).split())
+    if not value:
+        raise ValueError("empty search value")
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def clause(path, value):
+    return f"{path}:{phrase(value)}"
+
+
+def exists(path):
+    return f"_exists_:{path}"
+
+
+def range_clause(path, start, end):
+    for bound in (start, end):
+        if not RANGE_BOUND.match(bound):
+            raise ValueError(f"invalid range bound {bound!r}")
+    return f"{path}:[{start} TO {end}]"
+
+
+def any_of(path, values):
+    """One clause matching any of `values`, e.g. `(route:"ORAL" OR route:"TOPICAL")`."""
+    clauses = [clause(path, v) for v in dict.fromkeys(values)]
+    return clauses[0] if len(clauses) == 1 else "(" + " OR ".join(clauses) + ")"
+
+
+def combine(clauses, op="AND"):
+    op = op.upper()
+    if op not in ("AND", "OR"):
+        raise ValueError(f"unsupported operator {op!r}")
+    return f" {op} ".join(clauses)
+
+
+def _fields(dataset, param, *routes):
+    return [Field(dataset, path, route, param) for route, path in routes]
+
+
+def _sections(*routes):
+    return [Field("label", path, route) for route, path in routes]
+
+
+FIELDS = [
+    *_fields("ndc", "name", ("brand-name", "brand_name"), ("generic-name", "generic_name"),
+             ("manufacturer", "openfda.manufacturer_name"), ("active-ingredient", "active_ingredients.name")),
+    *_fields("ndc", "ndc", ("product-ndc", "product_ndc"), ("package-ndc", "packaging.package_ndc")),
+    Field("ndc", "dosage_form", "dosage-form", "form"),
+    Field("ndc", "route", "route", "route"),
+    Field("ndc", "product_type", "product-type", "type"),
+    Field("ndc", "finished", "finished", "finished"),
+    Field("ndc", "marketing_category", "marketing-category", "category"),
+    Field("ndc", "application_number", "application-number", "number"),
+    Field("ndc", "dea_schedule", "dea-schedule", "schedule"),
+    Field("ndc", "openfda.rxcui", "rxcui", "rxcui"),
+    Field("ndc", "openfda.unii", "unii", "unii"),
+    Field("ndc", "spl_id", "spl-id", "spl_id"),
+    Field("ndc", "openfda.spl_set_id", "spl-set-id", "spl_set_id"),
+    Field("ndc", "openfda.upc", "upc", "upc"),
+    Field("ndc", "openfda.is_original_packager", "original-packager", "is_original"),
+    *_fields("label", "name", ("brand-name", "openfda.brand_name"), ("generic-name", "openfda.generic_name"),
+             ("manufacturer", "openfda.manufacturer_name"), ("substance-name", "openfda.substance_name")),
+    Field("label", "openfda.route", "route", "route"),
+    Field("label", "openfda.product_type", "product-type", "type"),
+    *_sections(
+        # Abuse and overdosage
+        ("abuse", "abuse"), ("controlled-substance", "controlled_substance"), ("dependence", "dependence"),
+        ("overdosage", "overdosage"),
+        # Adverse effects and interactions
+        ("adverse-reactions", "adverse_reactions"), ("drug-interactions", "drug_interactions"),
+        ("laboratory-test-interactions", "drug_and_or_laboratory_test_interactions"),
+        # Clinical pharmacology
+        ("clinical-pharmacology", "clinical_pharmacology"), ("mechanism-of-action", "mechanism_of_action"),
+        ("pharmacodynamics", "pharmacodynamics"), ("pharmacokinetics", "pharmacokinetics"),
+        # Indications, usage, and dosage
+        ("indications-and-usage", "indications_and_usage"), ("contraindications", "contraindications"),
+        ("description", "description"), ("dosage-and-administration", "dosage_and_administration"),
+        ("dosage-forms-and-strengths", "dosage_forms_and_strengths"), ("active-ingredient", "active_ingredient"),
+        ("inactive-ingredient", "inactive_ingredient"), ("purpose", "purpose"),
+        # Nonclinical toxicology
+        ("animal-pharmacology-toxicology", "animal_pharmacology_and_or_toxicology"),
+        ("carcinogenesis-mutagenesis-fertility", "carcinogenesis_and_mutagenesis_and_impairment_of_fertility"),
+        ("nonclinical-toxicology", "nonclinical_toxicology"),
+        # Patient information
+        ("ask-doctor", "ask_doctor"), ("do-not-use", "do_not_use"), ("information-for-patients", "information_for_patients"),
+        ("instructions-for-use", "instructions_for_use"), ("keep-out-of-reach", "keep_out_of_reach_of_children"),
+        ("stop-use", "stop_use"), ("when-using", "when_using"),
+        # References
+        ("clinical-studies", "clinical_studies"), ("references", "references"),
+        # Special populations
+        ("labor-and-delivery", "labor_and_delivery"), ("nursing-mothers", "nursing_mothers"),
+        ("teratogenic-effects", "teratogenic_effects"),
+        # Supply, storage, and handling
+        ("how-supplied", "how_supplied"), ("storage-and-handling", "storage_and_handling"),
+        # Warnings and precautions
+        ("warnings", "warnings"), ("precautions", "precautions"), ("user-safety-warnings", "user_safety_warnings"),
+    ),
+    Field("label", "geriatric_use", "geriatric-use", exists=True),
+    Field("label", "pediatric_use", "pediatric-use", exists=True),
+    Field("label", "pregnancy", "pregnancy", exists=True),
+    Field("label", "boxed_warning", "boxed-warning", exists=True),
+]
+
+# Fields only reachable through /api/{dataset}/query (no per-field route of their own).
+QUERY_ONLY = {
+    "drugsfda": ["application_number", "sponsor_name", "openfda.brand_name", "openfda.generic_name", "openfda.manufacturer_name",
+                 "openfda.substance_name", "openfda.product_ndc", "openfda.rxcui", "openfda.spl_set_id", "products.brand_name",
+                 "products.dosage_form", "products.route", "products.marketing_status", "submissions.submission_type"],
+    "ndc": ["labeler_name", "openfda.pharm_class_epc", "openfda.pharm_class_pe", "openfda.pharm_class_moa", "openfda.pharm_class_cs"],
+    "label": ["set_id", "id", "openfda.product_ndc", "openfda.rxcui", "openfda.application_number", "openfda.spl_set_id"],
+}
+
+
+def query_fields(dataset):
+    """Every field path `/api/{dataset}/query` accepts as a filter."""
+    return list(dict.fromkeys([f.path for f in FIELDS if f.dataset == dataset] + QUERY_ONLY.get(dataset, [])))
@@ -0,0 +1,202 @@
+"""Outbound scheduler for openFDA calls: quota buckets, priorities, retries, load shedding.
+
+Every upstream request takes one token from each bucket (per-minute and
+per-day quota). When tokens run out, callers queue by priority, so
+interactive lookups are served before batch and export work. Requests that
+would wait longer than `max_wait`, or find the queue past its depth limit, are
+shed with Overloaded. 429 and transient 5xx answers are retried with jittered
+exponential backoff, and a Retry-After header pauses the whole scheduler for
+that long; a Retry-After past `backoff_max` is returned to the caller instead.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+INTERACTIVE, BATCH = 0, 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+request_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"upstream queue is full, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allows at most `quota` takes in any window of `period` seconds.
+
+    Holding only `burst` tokens and refilling at (quota - burst) / period keeps
+    a burst plus the refill inside the quota, which a bucket as large as the
+    quota would overshoot against a sliding-window limiter. `burst >= quota`
+    gives a plain bucket of the whole quota, for windows as long as a day where
+    holding back three quarters of it would only idle the service.
+    """
+
+    def __init__(self, quota, period, burst=None):
+        burst = max(1, quota // 4 if burst is None else burst)
+        if burst >= quota:
+            self.capacity, self.rate = max(quota, 1), max(quota, 1) / period
+        else:
+            self.capacity, self.rate = burst, (quota - burst) / period
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until one token is available."""
+        self._refill()
+        return self.wait(1)
+
+    def wait(self, n):
+        """Seconds until `n` tokens have been available, i.e. until the n-th queued take."""
+        self._refill()
+        return max(n - self.tokens, 0.0) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+class Scheduler:
+    def __init__(self, limits=((240, 60),), burst=None, max_queue=500, max_wait=30.0, retries=3, backoff_base=0.5, backoff_max=30.0):
+        # limits: (quota, period seconds) pairs; `burst` applies to the first (shortest) one, the longer ones get their whole quota.
+        self.buckets = [TokenBucket(quota, period, burst if i == 0 else quota) for i, (quota, period) in enumerate(limits)]
+        # Batch work is shed at half the depth, so it cannot crowd out interactive requests.
+        self.max_queue = {INTERACTIVE: max_queue, BATCH: max_queue // 2}
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.paused_until = 0.0
+        self.counters = {"requests": 0, "queued": 0, "shed": 0, "retries": 0, "throttled": 0}
+        self._waiters = []
+        self._seq = itertools.count()
+        self._dispatcher = None
+
+    @classmethod
+    def from_env(cls):
+        has_key = bool(os.getenv("OPENFDA_API_KEY"))
+        per_minute = int(os.getenv("OPENFDA_RATE_PER_MINUTE", "240"))
+        per_day = int(os.getenv("OPENFDA_RATE_PER_DAY", "120000" if has_key else "1000"))
+        return cls(
+            limits=[(per_minute, 60)] + ([(per_day, 86400)] if per_day else []),
+            burst=int(os.environ["OPENFDA_RATE_BURST"]) if os.getenv("OPENFDA_RATE_BURST") else None,
+            max_queue=int(os.getenv("SCHEDULER_MAX_QUEUE", "500")),
+            max_wait=float(os.getenv("SCHEDULER_MAX_WAIT", "30")),
+            retries=int(os.getenv("SCHEDULER_RETRIES", "3")),
+            backoff_base=float(os.getenv("SCHEDULER_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("SCHEDULER_BACKOFF_MAX", "30")),
+        )
+
+    def stats(self):
+        depth = {name: sum(1 for p, _, f in self._waiters if p == prio and not f.done()) for name, prio in PRIORITIES.items()}
+        return {**self.counters, "queue_depth": depth, "tokens": [round(b.tokens, 2) for b in self.buckets],
+                "paused_for": max(self.paused_until - time.monotonic(), 0.0)}
+
+    def _delay(self):
+        return max([self.paused_until - time.monotonic(), *(b.delay() for b in self.buckets)])
+
+    def expected_wait(self, position):
+        """Seconds until a request with `position` requests queued ahead of it would be sent."""
+        return max([self.paused_until - time.monotonic(), *(b.wait(position + 1) for b in self.buckets)])
+
+    def _take(self):
+        for bucket in self.buckets:
+            bucket.take()
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        for bucket in self.buckets[:1]:
+            bucket.drain()
+
+    async def acquire(self, priority=None):
+        priority = request_priority.get() if priority is None else priority
+        if not self._waiters and self._delay() <= 0:
+            self._take()
+            return
+        depth = sum(1 for p, _, f in self._waiters if p <= priority and not f.done())
+        wait = self.expected_wait(depth)
+        if depth >= self.max_queue.get(priority, self.max_queue[BATCH]) or wait > self.max_wait:
+            self.counters["shed"] += 1
+            raise Overloaded(max(wait, 1.0))
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.counters["queued"] += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        while self._waiters:
+            delay = self._delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # caller was cancelled while queued
+                continue
+            self._take()
+            future.set_result(None)
+
+    def backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            delay = min(retry_after, self.backoff_max) + random.uniform(0, self.backoff_base)
+        return delay
+
+    async def request(self, send, priority=None):
+        """Run `send()` (an httpx request coroutine factory) under the quota, retrying transient failures."""
+        for attempt in range(self.retries + 1):
+            await self.acquire(priority)
+            self.counters["requests"] += 1
+            try:
+                response = await send()
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+                self.counters["retries"] += 1
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return response
+            delay = self.backoff(attempt, response)
+            if response.status_code == 429:
+                self.counters["throttled"] += 1
+                self.pause(delay)
+                if (retry_after_seconds(response) or 0) > self.backoff_max:
+                    return response  # not worth holding the caller; the 429 and its Retry-After go back to it
+            self.counters["retries"] += 1
+            await asyncio.sleep(delay)
+        return response
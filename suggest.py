@@ -0,0 +1,152 @@
+"""Typeahead over drug names backed by sorted arrays in memory.
+
+Terms (brand, generic, substance and manufacturer names) are kept lowercased
+in one sorted list, so a prefix is a bisect range; parallel lists hold the
+display form, kinds and product count used for ranking. Top results for
+short prefixes, whose ranges are widest, are precomputed at build time.
+"""
+import asyncio
+import bisect
+import heapq
+import json
+import os
+import sys
+import time
+
+HOT_PREFIX = 3
+HOT_LIMIT = 20
+
+
+def normalize(term):
+    return " ".join(str(term).lower().split())
+
+
+class PrefixIndex:
+    def __init__(self, entries):
+        """entries: iterable of (display name, kind, product count)."""
+        merged = {}
+        for display, kind, count in entries:
+            key = normalize(display)
+            if not key:
+                continue
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [display, {kind}, count]
+            else:
+                entry[1].add(kind)
+                if count > entry[2]:
+                    entry[0], entry[2] = display, count
+        self.keys = sorted(merged)
+        self.display = [merged[k][0] for k in self.keys]
+        self.kinds = [",".join(sorted(merged[k][1])) for k in self.keys]
+        self.counts = [merged[k][2] for k in self.keys]
+        self.hot = {}
+        prefixes = {k[:n] for k in self.keys for n in range(1, HOT_PREFIX + 1)}
+        for prefix in prefixes:
+            self.hot[prefix] = self._top(prefix, HOT_LIMIT)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _rank(self, i):
+        return self.counts[i], -i
+
+    def _top(self, prefix, limit, kinds=None):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff", lo)
+        candidates = range(lo, hi)
+        if kinds:
+            candidates = [i for i in candidates if kinds.intersection(self.kinds[i].split(","))]
+        return heapq.nlargest(limit, candidates, key=self._rank)
+
+    def search(self, prefix, limit=10, kinds=None):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if not kinds and len(prefix) <= HOT_PREFIX and limit <= HOT_LIMIT:
+            ids = self.hot.get(prefix, [])[:limit]
+        else:
+            ids = self._top(prefix, limit, kinds)
+        return [{"term": self.display[i], "kinds": self.kinds[i].split(","), "count": self.counts[i]} for i in ids]
+
+    def nbytes(self):
+        size = sum(map(sys.getsizeof, (self.keys, self.display, self.kinds, self.counts, self.hot)))
+        size += sum(map(sys.getsizeof, self.keys)) + sum(map(sys.getsizeof, self.display))
+        size += sum(map(sys.getsizeof, set(self.kinds))) + sum(map(sys.getsizeof, set(self.counts)))
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.hot.items())
+        return size
+
+
+class Suggester:
+    """Holds the current PrefixIndex and rebuilds it in the background.
+
+    `load` is an async callable returning (display, kind, count) entries.
+    Requests keep using the old index until a rebuild finishes and swaps in.
+    """
+
+    def __init__(self, load, snapshot=None, refresh_seconds=86400):
+        self.load = load
+        self.snapshot = snapshot
+        self.refresh_seconds = refresh_seconds
+        self.index = None
+        self.built_at = None
+        self.build_seconds = None
+        self.source = None
+        self.error = None
+        self._task = None
+
+    def search(self, prefix, limit=10, kinds=None):
+        return self.index.search(prefix, limit, kinds) if self.index else []
+
+    def stats(self):
+        return {"ready": self.index is not None, "entries": len(self.index) if self.index else 0,
+                "memory_bytes": self.index.nbytes() if self.index else 0, "built_at": self.built_at,
+                "build_seconds": self.build_seconds, "source": self.source, "error": self.error}
+
+    def _read_snapshot(self):
+        if not self.snapshot or not os.path.exists(self.snapshot):
+            return None
+        if time.time() - os.path.getmtime(self.snapshot) > self.refresh_seconds:
+            return None
+        with open(self.snapshot, encoding="utf-8") as f:
+            return [tuple(e) for e in json.load(f)]
+
+    def _write_snapshot(self, entries):
+        tmp = self.snapshot + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.snapshot)
+
+    async def rebuild(self, use_snapshot=True):
+        started = time.perf_counter()
+        try:
+            entries = await asyncio.to_thread(self._read_snapshot) if use_snapshot else None
+            source = "snapshot"
+            if entries is None:
+                entries, source = list(await self.load()), "load"
+                if self.snapshot:
+                    await asyncio.to_thread(self._write_snapshot, entries)
+            self.index = await asyncio.to_thread(PrefixIndex, entries)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            return
+        self.built_at, self.source, self.error = time.time(), source, None
+        self.build_seconds = round(time.perf_counter() - started, 3)
+
+    async def _run(self):
+        await self.rebuild()
+        while True:
+            await asyncio.sleep(self.refresh_seconds if self.error is None else 60)
+            await self.rebuild(use_snapshot=False)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,97 @@
+import pytest
+
+import batch
+
+
+@pytest.mark.parametrize("value, kind, forms", [
+    ("0002-3227-30", "package_ndc", ["0002-3227-30"]),
+    ("00002-3227-30", "package_ndc", ["0002-3227-30"]),
+    ("00002322730", "package_ndc", ["0002-3227-30"]),
+    ("0002322730", "package_ndc", ["0002-3227-30", "00023-227-30", "00023-2273-0"]),
+    ("50090-0123-01", "package_ndc", ["50090-123-01", "50090-0123-1"]),
+    ("0002-3227", "product_ndc", ["0002-3227"]),
+    ("000023227", "product_ndc", ["00002-3227", "0002-3227"]),
+    ("00023227", "product_ndc", ["0002-3227", "00023-227"]),
+    (" 0002-3227 ", "product_ndc", ["0002-3227"]),
+])
+def test_ndc_forms(value, kind, forms):
+    assert batch.ndc_forms(value, kind) == forms
+
+
+@pytest.mark.parametrize("value, kind", [
+    ("0002-32a7-30", "package_ndc"),
+    ("1-2-3-4", "package_ndc"),
+    ("000232273", "package_ndc"),
+    ("0002-3227-30", "product_ndc"),
+    ("123456-123", "product_ndc"),
+])
+def test_ndc_forms_rejects(value, kind):
+    with pytest.raises(ValueError):
+        batch.ndc_forms(value, kind)
+
+
+@pytest.mark.parametrize("value, kind", [
+    ("0002-3227-30", "package_ndc"),
+    ("00002322730", "package_ndc"),
+    ("0002322730", "package_ndc"),
+    ("0002-3227", "product_ndc"),
+    ("000023227", "product_ndc"),
+    ("R16CO5Y76E", "unii"),
+    ("r16co5y76e", "unii"),
+    ("1191", "rxcui"),
+])
+def test_detect(value, kind):
+    assert batch.detect(value) == kind
+
+
+@pytest.mark.parametrize("value", ["aspirin", "12345678901234", ""])
+def test_detect_rejects(value):
+    with pytest.raises(ValueError):
+        batch.detect(value)
+
+
+def test_normalize():
+    assert batch.normalize("r16co5y76e") == ("unii", ["R16CO5Y76E"])
+    assert batch.normalize(" 1191 ") == ("rxcui", ["1191"])
+    assert batch.normalize("00002322730") == ("package_ndc", ["0002-3227-30"])
+    with pytest.raises(ValueError):
+        batch.normalize("abc", "rxcui")
+
+
+def test_build_query_quotes_terms():
+    assert batch.build_query("openfda.rxcui", ["1191", "1191 OR x"]) == 'openfda.rxcui:"1191" OR openfda.rxcui:"1191 OR x"'
+
+
+def test_plan_groups_term_budget():
+    items = [(str(i), "rxcui", [str(i)]) for i in range(12)]
+    groups = batch.plan_groups(items, 10000)
+    assert [len(members) for _, members, _ in groups] == [5, 5, 2]
+    assert [t for _, _, terms in groups for t in terms] == [str(i) for i in range(12)]
+
+
+def test_plan_groups_length_budget():
+    items = [(f"0002-{i:04d}-01", "package_ndc", [f"0002-{i:04d}-01"]) for i in range(20)]
+    groups = batch.plan_groups(items, 200)
+    assert len(groups) > 1
+    for kind, members, terms in groups:
+        assert kind == "package_ndc"
+        assert len(batch.quote_plus(batch.build_query(batch.FIELDS[kind], terms))) <= 200
+    assert sum(len(members) for _, members, _ in groups) == 20
+
+
+def test_plan_groups_keeps_oversized_item():
+    items = [("x", "package_ndc", ["0002-3227-30"])]
+    assert batch.plan_groups(items, 10) == [("package_ndc", items, ["0002-3227-30"])]
+
+
+def test_plan_groups_by_kind():
+    items = [("1191", "rxcui", ["1191"]), ("0002-3227", "product_ndc", ["0002-3227"]), ("R16CO5Y76E", "unii", ["R16CO5Y76E"])]
+    assert [kind for kind, _, _ in batch.plan_groups(items, 1000)] == ["product_ndc", "rxcui", "unii"]
+
+
+def test_split_terms_within_length_budget():
+    terms = [f"{n:08x}-0000-4000-8000-000000000000" for n in range(40)]
+    chunks = batch.split_terms("set_id", terms, 1500)
+    assert len(chunks) > 1 and sum(chunks, []) == terms
+    assert all(len(batch.quote_plus(batch.build_query("set_id", c))) <= 1500 for c in chunks)
+    assert batch.split_terms("set_id", terms[:1], 10) == [terms[:1]]
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from cache import MemoryLRU, ResponseCache, SQLiteTier, cache_key
+
+URL = "https://api.fda.gov/drug/ndc.json"
+
+
+class Upstream:
+    def __init__(self, delay=0.05, error=None):
+        self.delay, self.error, self.calls, self.cancelled = delay, error, 0, 0
+
+    async def __call__(self, url, search_query, limit):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return {"results": [search_query]}
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def run():
+        cache, upstream = ResponseCache(), Upstream()
+        results = await asyncio.gather(*(cache.get_or_fetch(URL, "advil", 10, upstream) for _ in range(5)))
+        assert results == [{"results": ["advil"]}] * 5
+        assert upstream.calls == 1 and cache.counters["collapsed"] == 4
+        assert await cache.get_or_fetch(URL, "advil", 10, upstream) == {"results": ["advil"]}
+        assert upstream.calls == 1 and cache.counters["hits"] == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    async def run():
+        cache, upstream = ResponseCache(), Upstream()
+        leader = asyncio.create_task(cache.get_or_fetch(URL, "advil", 10, upstream))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(cache.get_or_fetch(URL, "advil", 10, upstream))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == {"results": ["advil"]}
+        assert leader.cancelled()
+        assert upstream.calls == 1 and upstream.cancelled == 0
+
+    asyncio.run(run())
+
+
+def test_fetch_cancelled_once_nobody_waits():
+    async def run():
+        cache, upstream = ResponseCache(), Upstream()
+        waiters = [asyncio.create_task(cache.get_or_fetch(URL, "advil", 10, upstream)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert upstream.cancelled == 1 and not cache._inflight
+        # The next miss starts a fresh fetch instead of joining the cancelled one.
+        assert await cache.get_or_fetch(URL, "advil", 10, upstream) == {"results": ["advil"]}
+        assert upstream.calls == 2
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def run():
+        cache, upstream = ResponseCache(), Upstream(error=RuntimeError("upstream down"))
+        results = await asyncio.gather(*(cache.get_or_fetch(URL, "advil", 10, upstream) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        upstream.error = None
+        assert await cache.get_or_fetch(URL, "advil", 10, upstream) == {"results": ["advil"]}
+        assert upstream.calls == 2
+
+    asyncio.run(run())
+
+
+def test_stale_entry_served_while_refreshing():
+    async def run():
+        cache, upstream = ResponseCache(default_ttl=60, stale=3600), Upstream(delay=0)
+        key = cache_key(URL, "advil", 10)
+        cache.memory.put(key, b'{"results": ["old"]}', time.time() - 120)
+        assert await cache.get_or_fetch(URL, "advil", 10, upstream) == {"results": ["old"]}
+        await asyncio.gather(*cache._refreshing)
+        assert await cache.get_or_fetch(URL, "advil", 10, upstream) == {"results": ["advil"]}
+        assert cache.counters["stale_hits"] == 1 and cache.counters["refreshes"] == 1
+
+    asyncio.run(run())
+
+
+def test_cache_key_normalizes_whitespace():
+    assert cache_key(URL, "brand_name:advil  AND  route:oral", 10) == cache_key(URL, "brand_name:advil AND route:oral", 10)
+
+
+def test_memory_lru_evicts_least_recently_used():
+    lru = MemoryLRU(30)
+    lru.put("a", b"x" * 10, 0)
+    lru.put("b", b"x" * 10, 0)
+    lru.get("a")
+    lru.put("c", b"x" * 15, 0)
+    assert lru.get("b") is None and lru.get("a") is not None and lru.bytes == 25
+    lru.put("big", b"x" * 31, 0)
+    assert lru.get("big") is None
+
+
+def test_sqlite_tier_size_cap(tmp_path):
+    tier = SQLiteTier(str(tmp_path / "cache.db"), max_bytes=10_000)
+    for i in range(50):
+        tier.put(str(i), b"x" * 1000, i)
+    assert tier.bytes <= 10_000 and tier.evictions > 0
+    assert tier.get("0") is None and tier.get("49") is not None
+    tier.close()
+    reopened = SQLiteTier(str(tmp_path / "cache.db"), max_bytes=10_000)
+    assert reopened.bytes == tier.bytes
+    reopened.close()
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import export
+
+
+async def pages_of(*pages, log=None):
+    for page in pages:
+        if log is not None:
+            log.append(len(log))
+        yield page
+
+
+async def collect(pages):
+    return [page async for page in pages]
+
+
+def test_limited_cuts_the_last_page_and_stops():
+    log = []
+    pages = asyncio.run(collect(export.limited(pages_of([1, 2, 3], [4, 5, 6], [7], log=log), 5)))
+    assert pages == [[1, 2, 3], [4, 5]]
+    assert log == [0, 1]  # the third page is never pulled
+
+
+def test_limited_without_cap():
+    assert asyncio.run(collect(export.limited(pages_of([1], [], [2]), None))) == [[1], [2]]
+
+
+def test_prefetch_runs_ahead_by_depth():
+    log = []
+
+    async def run():
+        pages = export.prefetch(pages_of(*([n] for n in range(10)), log=log), 2)
+        first = await anext(pages)
+        await asyncio.sleep(0.01)
+        ahead = len(log)
+        rest = await collect(pages)
+        return first, ahead, rest
+
+    first, ahead, rest = asyncio.run(run())
+    assert first == [0] and rest == [[n] for n in range(1, 10)]
+    assert ahead <= 4  # one consumed, two queued, one waiting to be put
+
+
+def test_prefetch_reraises_producer_errors():
+    async def failing():
+        yield [1]
+        raise ValueError("boom")
+
+    async def run():
+        return await collect(export.prefetch(failing(), 2))
+
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(run())
+
+
+def test_encode_ndjson():
+    chunks = asyncio.run(collect(export.encode(pages_of([{"a": 1}], [{"a": 2}]), "ndjson", [])))
+    assert chunks == [b'{"a":1}\n', b'{"a":2}\n']
+
+
+def test_encode_csv_joins_lists_and_quotes():
+    pages = pages_of([{"id": "1", "openfda": {"brand_name": ["A", "B"]}}], [{"id": "2,3"}])
+    body = b"".join(asyncio.run(collect(export.encode(pages, "csv", ["id", "openfda.brand_name"]))))
+    assert body.decode().splitlines() == ["id,openfda.brand_name", "1,A|B", '"2,3",']
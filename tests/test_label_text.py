@@ -0,0 +1,62 @@
+from label_text import LabelTextIndex
+
+
+def doc(n, **sections):
+    return {"set_id": f"set-{n}", "id": f"v-{n}", **{k: [v] for k, v in sections.items()}}
+
+
+def test_full_matches_rank_before_rare_and_common_terms(tmp_path):
+    index = LabelTextIndex(str(tmp_path / "lt.db"), candidates=5)
+    index.add([doc(0, warnings="liver injury with warfarin"), doc(1, warnings="warfarin interaction"),
+               *(doc(n, description="common liver text") for n in range(2, 12))])
+    result = index.search("warfarin liver", limit=3)
+    assert [r["doc"]["set_id"] for r in result["results"][:2]] == ["set-0", "set-1"]
+    assert [r["match"] for r in result["results"]] == ["all", "any", "any"]
+    index.close()
+
+
+def test_candidate_window_prefers_weighted_sections(tmp_path):
+    index = LabelTextIndex(str(tmp_path / "lt.db"), candidates=3)
+    index.add([doc(n, description="bleeding") for n in range(5)] + [doc(9, boxed_warning="bleeding")])
+    result = index.search("bleeding", limit=10)
+    assert result["meta"]["exhaustive"] is False
+    assert result["meta"]["results"]["total"] == 3
+    assert result["results"][0]["doc"]["set_id"] == "set-9"
+    index.close()
+    index = LabelTextIndex(str(tmp_path / "lt.db"))
+    assert index.search("bleeding")["meta"]["exhaustive"] is True
+    index.close()
+
+
+def test_new_version_replaces_sections(tmp_path):
+    index = LabelTextIndex(str(tmp_path / "lt.db"))
+    index.add([doc(0, boxed_warning="hepatotoxicity", description="tablets")])
+    index.add([{**doc(0, warnings="rash"), "id": "v-new"}])
+    assert index.search("hepatotoxicity")["results"] == []
+    assert index.search("tablets")["results"] == []
+    assert index.search("rash")["results"][0]["doc"]["id"] == "v-new"
+    index.close()
+
+
+def test_stats_label_count_without_scanning(tmp_path):
+    path = str(tmp_path / "lt.db")
+    index = LabelTextIndex(path)
+    index.add([doc(n, warnings="rash") for n in range(5)])
+    index.add([{**doc(0, warnings="hives"), "id": "v-new"}, doc(1, warnings="rash"), doc(9, warnings="rash")])
+    assert index.stats()["labels"] == 6
+    other = LabelTextIndex(path)  # another worker on the same file
+    other.add([doc(10, warnings="rash")])
+    assert index.stats()["labels"] == 7
+    other.close()
+    index.close()
+
+
+def test_stats_counts_labels_of_older_files(tmp_path):
+    path = str(tmp_path / "lt.db")
+    index = LabelTextIndex(path)
+    index.add([doc(n, warnings="rash") for n in range(3)])
+    index.db.execute("DROP TABLE counts")
+    index.close()
+    index = LabelTextIndex(path)
+    assert index.stats()["labels"] == 3
+    index.close()
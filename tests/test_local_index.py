@@ -0,0 +1,123 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import local_index
+from benchmarks.fixtures import records, write_bulk
+
+
+@pytest.mark.parametrize("expr, word, parts", [
+    ('brand_name:"advil" AND route:"ORAL"', "AND", ['brand_name:"advil"', 'route:"ORAL"']),
+    ("brand_name:advil+AND+route:ORAL", "AND", ["brand_name:advil", "route:ORAL"]),
+    ('brand_name:"salt AND pepper" AND route:"ORAL"', "AND", ['brand_name:"salt AND pepper"', 'route:"ORAL"']),
+    ('brand_name:"a \\" AND b" OR x:"y"', "OR", ['brand_name:"a \\" AND b"', 'x:"y"']),
+    ('(a:"1" OR b:"2") AND c:"3"', "OR", ['(a:"1" OR b:"2") AND c:"3"']),
+    ('(a:"1" OR b:"2") AND c:"3"', "AND", ['(a:"1" OR b:"2")', 'c:"3"']),
+    ('brand_name:"ANDROGEL"', "AND", ['brand_name:"ANDROGEL"']),
+])
+def test_split_connective(expr, word, parts):
+    assert local_index.split_connective(expr, word) == parts
+
+
+@pytest.mark.parametrize("value, text", [
+    ('"tylenol extra"', "tylenol extra"),
+    ('"say \\"hi\\" \\\\ there"', 'say "hi" \\ there'),
+    ('"a+b"', "a+b"),
+    ("tylenol+extra", "tylenol extra"),
+    ("  advil ", "advil"),
+])
+def test_unquote(value, text):
+    assert local_index.unquote(value) == text
+
+
+def test_iter_results_streams_across_chunks():
+    docs = [{"id": i, "text": "x" * (i * 7), "nested": {"q": '"}]'}} for i in range(50)]
+    body = '{"meta": {"results": {"total": 50}}, "results": [' + ", ".join(map(local_index.json.dumps, docs)) + "], \"after\": 1}"
+    assert list(local_index.iter_results(io.StringIO(body), chunk_size=16)) == docs
+
+
+def test_iter_results_empty_and_malformed():
+    assert list(local_index.iter_results(io.StringIO('{"meta": {}, "results": []}'))) == []
+    with pytest.raises(ValueError):
+        list(local_index.iter_results(io.StringIO('["not", "an", "object"]')))
+
+
+def quiet(*args):
+    pass
+
+
+def test_search_phrase_with_escapes(tmp_path):
+    path, db = str(tmp_path / "drug-ndc-0001-of-0001.json"), str(tmp_path / "drug_index.db")
+    docs = list(records("ndc", 20))
+    docs[0]["brand_name"] = 'Say "Hi" Tablets'
+    write_bulk(path, "ndc", docs)
+    local_index.ingest(db, [path], log=quiet)
+    index = local_index.LocalIndex(db)
+    try:
+        assert index.search("ndc", 'brand_name:"say \\"hi\\""')["results"][0]["brand_name"] == 'Say "Hi" Tablets'
+        assert index.search("ndc", 'brand_name:"advil" AND route:"ORAL"')["meta"]["results"]["total"] == 1  # record 10; record 0 was renamed
+        with pytest.raises(ValueError):
+            index.search("ndc", 'no_such_field:"x"')
+    finally:
+        index.close()
+
+
+def test_connection_per_thread(tmp_path):
+    path, db = str(tmp_path / "drug-ndc-0001-of-0001.json"), str(tmp_path / "drug_index.db")
+    write_bulk(path, "ndc", records("ndc", 100))
+    local_index.ingest(db, [path], log=quiet)
+    index = local_index.LocalIndex(db)
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            totals = list(pool.map(lambda _: index.search("ndc", 'brand_name:"advil"')["meta"]["results"]["total"], range(40)))
+        assert totals == [10] * 40
+        assert 1 <= len(index._readers) <= 4
+    finally:
+        index.close()
+
+
+def test_search_after_pages_by_doc_id(tmp_path):
+    path, db = str(tmp_path / "drug-label-0001-of-0001.json"), str(tmp_path / "drug_index.db")
+    write_bulk(path, "label", records("label", 500))
+    local_index.ingest(db, [path], log=quiet)
+    index = local_index.LocalIndex(db)
+    try:
+        for query in ['drug_interactions:"macrolide antibiotics"', "_exists_:boxed_warning AND openfda.generic_name:warfarin",
+                      'openfda.generic_name:warfarin OR drug_interactions:"macrolide antibiotics"']:
+            expected = [d["set_id"] for d in index.search("label", query, 1000)["results"]]
+            pages, after = [], 0
+            while True:
+                page, after = index.search_after("label", query, 7, after)
+                if not page:
+                    break
+                pages.append(page)
+            assert all(len(p) == 7 for p in pages[:-1])
+            assert [d["set_id"] for p in pages for d in p] == expected
+    finally:
+        index.close()
+
+
+def test_rebuild_under_open_reader(tmp_path):
+    # ingest, refresh and ingest again while the app keeps its reader open: every build keeps its own -wal/-shm.
+    path, db = str(tmp_path / "drug-ndc-0001-of-0001.json.zip"), str(tmp_path / "drug_index.db")
+    query = 'brand_name:"advil"'
+    write_bulk(path, "ndc", records("ndc", 300))
+    local_index.ingest(db, [path], log=quiet)
+    index = local_index.LocalIndex(db)
+    try:
+        assert index.search("ndc", query)["meta"]["results"]["total"] == 30
+        write_bulk(path, "ndc", records("ndc", 250, 100))
+        local_index.refresh(db, [path], log=quiet)
+        assert index.search("ndc", query)["meta"]["results"]["total"] == 25
+        write_bulk(path, "ndc", records("ndc", 200, 7))
+        local_index.ingest(db, [path], log=quiet)
+        assert index.search("ndc", query)["meta"]["results"]["total"] == 20
+        local_index.refresh(db, [path], log=quiet)
+        write_bulk(path, "ndc", records("ndc", 100))
+        local_index.ingest(db, [path], log=quiet)
+        assert index.search("ndc", query)["meta"]["results"]["total"] == 10
+    finally:
+        index.close()
+    builds = {p.name.split("-")[0] for p in tmp_path.iterdir() if p.name.startswith("drug_index.db.")}
+    assert len(builds) == 2  # the current build and the one before it
@@ -0,0 +1,150 @@
+import asyncio
+import threading
+from urllib.parse import quote_plus
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+FIELDS = ["a", "b", "c", "d", "e", "f"]
+
+
+class Fields:
+    """search_endpoint stub answering `field:"query"` with ten results per field after `delay[field]` seconds."""
+
+    def __init__(self, delay=0.05, overlap=False, fail=(), delays=None):
+        self.delay, self.overlap, self.fail, self.delays = delay, overlap, set(fail), delays or {}
+        self.sent = []
+
+    async def __call__(self, url, search_query, limit=10):
+        field = search_query.split(":")[0]
+        self.sent.append(field)
+        await asyncio.sleep(self.delays.get(field, self.delay))
+        if field in self.fail:
+            raise HTTPException(status_code=500, detail="upstream error")
+        return {"results": [{"id": f"{'x' if self.overlap else field}{n}"} for n in range(10)]}
+
+
+def search_all(monkeypatch, stub, limit, concurrency=6, deadline=None, fields=FIELDS):
+    monkeypatch.setattr(main, "search_endpoint", stub)
+    monkeypatch.setattr(main, "FANOUT_CONCURRENCY", concurrency)
+    return asyncio.run(main.search_all(main.NDC_URL, fields, "q", "id", limit, deadline=deadline))
+
+
+def test_merges_in_field_order_without_duplicates(monkeypatch):
+    stub = Fields(delays={"a": 0.06, "b": 0.01})
+    result = search_all(monkeypatch, stub, 100, fields=["a", "b"])
+    assert [r["id"] for r in result["results"]] == [f"a{n}" for n in range(10)] + [f"b{n}" for n in range(10)]
+    result = search_all(monkeypatch, Fields(overlap=True), 100, fields=["a", "b"])
+    assert result["meta"]["results"]["total"] == 10
+
+
+def test_early_stop_counts_answered_fields_as_ok(monkeypatch):
+    # All six are sent at once; a and b fill the limit, so c (answered in time) is ok and d-f are cancelled.
+    stub = Fields(delays={"a": 0.02, "b": 0.02, "c": 0.02, "d": 0.5, "e": 0.5, "f": 0.5})
+    result = search_all(monkeypatch, stub, 20)
+    assert len(result["results"]) == 20
+    assert result["meta"]["fields"] == {"failed": [], "timed_out": [], "cancelled": ["d", "e", "f"], "skipped": []}
+
+
+def test_early_stop_skips_fields_waiting_for_a_slot(monkeypatch):
+    stub = Fields()
+    result = search_all(monkeypatch, stub, 20, concurrency=2)
+    assert stub.sent == ["a", "b"]
+    assert result["meta"]["fields"]["skipped"] == ["c", "d", "e", "f"]
+    assert result["meta"]["fields"]["cancelled"] == []
+
+
+def test_failed_and_timed_out_fields(monkeypatch):
+    stub = Fields(fail={"b"}, delays={"c": 1.0})
+    result = search_all(monkeypatch, stub, 100, deadline=0.3)
+    fields = result["meta"]["fields"]
+    assert fields["failed"] == [{"field": "b", "status": 500, "detail": "upstream error"}]
+    assert fields["timed_out"] == ["c"]
+    assert [r["id"][0] for r in result["results"][::10]] == ["a", "d", "e", "f"]  # merged past the timed-out field
+
+
+def test_rejects_invalid_query(monkeypatch):
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.search_all(main.NDC_URL, ["a"], "   ", "id", 10))
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("value, kind, terms", [
+    ("nda020702", "application_number", ["NDA020702"]),
+    ("ABCDEF01-2345-4789-abcd-ef0123456789", "set_id", ["abcdef01-2345-4789-abcd-ef0123456789"]),
+    ("0002-3227", "product_ndc", ["0002-3227"]),
+])
+def test_profile_identifier(value, kind, terms):
+    assert main.profile_identifier(value) == (kind, terms)
+
+
+@pytest.mark.parametrize("value", ["hello", "R16CO5Y76E"])  # not an identifier; a UNII
+def test_profile_identifier_rejects(value):
+    with pytest.raises(HTTPException) as e:
+        main.profile_identifier(value)
+    assert e.value.status_code == 400
+
+
+class Profile:
+    """search_endpoint stub: drugsfda and ndc know NDA000001, labels only answer by set_id."""
+
+    def __init__(self, set_ids):
+        self.set_ids, self.queries = set_ids, []
+
+    async def __call__(self, url, search_query, limit=10):
+        self.queries.append((main.dataset_of(url), search_query))
+        if url == main.DRUGSFDA_URL:
+            return {"results": [{"application_number": "NDA000001", "openfda": {"spl_set_id": self.set_ids[:1]}}]}
+        if url == main.NDC_URL:
+            return {"results": [{"product_id": f"p{n}", "product_ndc": f"0000-{n:04d}", "openfda": {"spl_set_id": [s]}}
+                                for n, s in enumerate(self.set_ids)]}
+        return {"results": [{"id": s, "set_id": s} for s in self.set_ids if f'"{s}"' in search_query]}
+
+
+def test_profile_follows_links_within_query_budget(monkeypatch):
+    set_ids = [f"{n:08x}-0000-4000-8000-000000000000" for n in range(40)]
+    stub = Profile(set_ids)
+    monkeypatch.setattr(main, "search_endpoint", stub)
+    body = TestClient(main.app).get("/api/drug/NDA000001", params={"limit": 40, "fields": "set_id"}).json()
+    label_queries = [q for dataset, q in stub.queries if dataset == "label"]
+    assert len(label_queries) > 2  # the application number, then the set ids in several queries
+    assert all(len(quote_plus(q)) <= main.BATCH_MAX_QUERY_CHARS for q in label_queries)
+    assert sorted(r["set_id"] for r in body["label"]) == set_ids
+    assert body["meta"]["upstream_queries"] == 2 + len(label_queries)
+
+
+def test_local_backend_searches_off_the_event_loop(monkeypatch):
+    class Index:
+        def search(self, dataset, search_query, limit):
+            threads.append(threading.get_ident())
+            return {"results": []}
+
+    threads = []
+    monkeypatch.setattr(main, "local_index", Index())
+    asyncio.run(main.search_endpoint(main.NDC_URL, 'brand_name:"advil"'))
+    assert threads and threads[0] != threading.get_ident()
+
+
+@pytest.mark.parametrize("params", [{"max_records": 0}, {"max_records": -2}])
+def test_export_rejects_max_records_below_one(params):
+    assert TestClient(main.app).get("/api/ndc/export", params={"search": "brand_name:advil", **params}).status_code == 422
+
+
+@pytest.mark.parametrize("max_chars", [0, -5])
+def test_label_routes_reject_max_chars_below_one(max_chars):
+    assert TestClient(main.app).get("/api/label/search/all", params={"query": "advil", "max_chars": max_chars}).status_code == 422
+
+
+@pytest.mark.parametrize("limit, status", [(0, 422), (51, 422), (50, 200)])
+def test_suggest_limit_bounds(limit, status):
+    assert TestClient(main.app).get("/api/suggest", params={"prefix": "adv", "limit": limit}).status_code == status
+
+
+def test_metrics_record_requests_by_route_template():
+    client = TestClient(main.app)
+    client.get("/api/suggest", params={"prefix": "adv"})
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{route="/api/suggest",method="GET",status="200"}' in body
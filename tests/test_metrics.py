@@ -0,0 +1,63 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", [])
+    monkeypatch.setattr(metrics, "_collectors", [])
+
+
+def test_counter_and_gauge_render(registry):
+    hits = metrics.counter("hits_total", "Hits.", ["route"])
+    hits.inc(route="/a")
+    hits.inc(2, route="/a")
+    hits.inc(route='/b"\n')
+    depth = metrics.gauge("depth", "Depth.")
+    depth.inc(3)
+    depth.dec()
+    assert metrics.render().splitlines() == [
+        "# HELP hits_total Hits.", "# TYPE hits_total counter",
+        'hits_total{route="/a"} 3', 'hits_total{route="/b\\"\\n"} 1',
+        "# HELP depth Depth.", "# TYPE depth gauge", "depth 2",
+    ]
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive(registry):
+    latency = metrics.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, route="/a")
+    lines = [line for line in metrics.render().splitlines() if not line.startswith("#")]
+    assert lines == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 2.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_histogram_time(registry):
+    latency = metrics.histogram("op_seconds", "Op.", ["op"])
+    with latency.time(op="x") as labels:
+        labels["op"] = "y"  # labels can be filled in while timing
+    assert list(latency.series) == [("y",)]
+
+
+def test_collectors_export_numbers_only(registry):
+    metrics.collect("cache", "Cache stats.", lambda: {"hits": 4, "ratio": 0.5, "ready": True, "path": "/tmp/x"})
+    assert [line for line in metrics.render().splitlines() if not line.startswith("#")] == ["cache_hits 4", "cache_ratio 0.5"]
+
+
+def test_tracer_keeps_slow_sampled_requests():
+    tracer = metrics.Tracer(sample_rate=1.0, slow_ms=0.0, keep=2)
+    for path in ("/a", "/b", "/c"):
+        with tracer.request("GET", path):
+            with metrics.span("search", dataset="ndc"):
+                pass
+    recent = tracer.recent()
+    assert [t["path"] for t in recent] == ["/c", "/b"]
+    assert recent[0]["spans"][0]["name"] == "search" and recent[0]["spans"][0]["dataset"] == "ndc"
+    with metrics.Tracer(sample_rate=0.0).request("GET", "/a") as trace:
+        assert trace is None
@@ -0,0 +1,42 @@
+import projection
+
+LABEL = {"set_id": "s1", "id": "v1", "openfda": {"brand_name": ["Advil"], "rxcui": ["1", "2"]},
+         "warnings": ["x" * 50 + " liver damage " + "y" * 50], "boxed_warning": ["short"]}
+
+
+def test_field_tree_shorter_path_wins():
+    assert projection.field_tree(["openfda.brand_name", "set_id"]) == {"openfda": {"brand_name": projection.KEEP}, "set_id": projection.KEEP}
+    assert projection.field_tree(["openfda", "openfda.brand_name"]) == {"openfda": projection.KEEP}
+
+
+def test_prune_keeps_requested_paths_through_lists():
+    tree = projection.field_tree(["set_id", "openfda.brand_name", "products.product_number", "missing.field"])
+    doc = {**LABEL, "products": [{"product_number": "001", "x": 1}, {"product_number": "002"}]}
+    assert projection.prune(doc, tree) == {"set_id": "s1", "openfda": {"brand_name": ["Advil"]},
+                                           "products": [{"product_number": "001"}, {"product_number": "002"}]}
+
+
+def test_excerpt_centers_on_the_first_term():
+    text = LABEL["warnings"][0]
+    cut = projection.excerpt(text, 30, ["liver"])
+    assert cut.startswith("…") and cut.endswith("…") and "liver" in cut
+    assert len(cut) == 32
+    assert projection.excerpt(text, 30, []) == text[:30] + "…"
+    assert projection.excerpt("short", 30, ["liver"]) == "short"
+
+
+def test_project_keeps_identifiers_whole():
+    data = {"meta": {"results": {"total": 1}}, "results": [LABEL]}
+    out = projection.project(data, ["*"], max_chars=10, query="liver")
+    record = out["results"][0]
+    assert record["openfda"] == LABEL["openfda"] and record["set_id"] == "s1"
+    assert "liver" in record["warnings"][0] and len(record["warnings"][0]) <= 12
+    assert record["boxed_warning"] == ["short"]
+    assert LABEL["warnings"][0].startswith("xxx")  # the input is not modified
+    assert out["meta"] == data["meta"]
+
+
+def test_project_default_fields():
+    out = projection.project({"results": [LABEL]}, projection.default_fields(["boxed_warning", "openfda.rxcui"]))
+    assert set(out["results"][0]) == {"set_id", "id", "openfda", "boxed_warning"}
+    assert projection.parse_fields(" set_id, ,openfda.rxcui ") == ["set_id", "openfda.rxcui"]
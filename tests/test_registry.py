@@ -0,0 +1,53 @@
+import pytest
+
+import registry
+
+
+def test_phrase_escapes_quotes_and_backslashes():
+    assert registry.phrase('say "hi" \\ there') == '"say \\"hi\\" \\\\ there"'
+
+
+def test_phrase_collapses_whitespace():
+    assert registry.phrase("  tylenol \t extra  strength ") == '"tylenol extra strength"'
+
+
+@pytest.mark.parametrize("value", ["", "   "])
+def test_phrase_rejects_empty(value):
+    with pytest.raises(ValueError):
+        registry.phrase(value)
+
+
+def test_clause_keeps_query_syntax_inside_the_phrase():
+    assert registry.clause("brand_name", 'x" OR _exists_:y') == 'brand_name:"x\\" OR _exists_:y"'
+    assert registry.clause("brand_name", "a+b AND c") == 'brand_name:"a+b AND c"'
+
+
+def test_any_of():
+    assert registry.any_of("route", ["ORAL"]) == 'route:"ORAL"'
+    assert registry.any_of("route", ["ORAL", "TOPICAL", "ORAL"]) == '(route:"ORAL" OR route:"TOPICAL")'
+
+
+def test_combine():
+    assert registry.combine(["a:1", "b:2"]) == "a:1 AND b:2"
+    assert registry.combine(["a:1", "b:2"], "or") == "a:1 OR b:2"
+    with pytest.raises(ValueError):
+        registry.combine(["a:1"], "NOT")
+
+
+def test_range_clause():
+    assert registry.range_clause("effective_time", "20200101", "20201231") == "effective_time:[20200101 TO 20201231]"
+    with pytest.raises(ValueError):
+        registry.range_clause("effective_time", "2020] OR x:[1", "2021")
+
+
+def test_query_fields():
+    fields = registry.query_fields("drugsfda")
+    assert "openfda.brand_name" in fields and "application_number" in fields
+    assert len(fields) == len(set(fields))
+    assert "brand_name" in registry.query_fields("ndc")
+    assert "warnings" in registry.query_fields("label")
+
+
+def test_routes_are_unique_per_dataset():
+    routes = [(f.dataset, f.route) for f in registry.FIELDS]
+    assert len(routes) == len(set(routes))
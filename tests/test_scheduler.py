@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+
+import scheduler
+
+
+def test_token_bucket_burst_and_full_quota():
+    minute = scheduler.TokenBucket(240, 60)
+    assert minute.capacity == 60 and minute.rate == pytest.approx(3.0)
+    day = scheduler.TokenBucket(1000, 86400, burst=1000)
+    assert day.capacity == 1000 and day.rate == pytest.approx(1000 / 86400)
+
+
+def test_daily_bucket_gets_its_whole_quota():
+    s = scheduler.Scheduler(limits=[(240, 60), (1000, 86400)])
+    assert [b.capacity for b in s.buckets] == [60, 1000]
+
+
+def test_sheds_when_expected_wait_exceeds_max_wait():
+    async def run():
+        s = scheduler.Scheduler(limits=[(10, 60)], max_wait=5)  # 2 tokens, then one every 7.5 s
+        await s.acquire()
+        await s.acquire()
+        with pytest.raises(scheduler.Overloaded) as shed:
+            await s.acquire()
+        assert shed.value.retry_after == pytest.approx(7.5, abs=0.1)
+        assert s.counters["shed"] == 1
+
+    asyncio.run(run())
+
+
+def test_queues_when_expected_wait_is_short():
+    async def run():
+        s = scheduler.Scheduler(limits=[(1200, 60)], burst=1, max_wait=5)  # one token every 0.05 s
+        await asyncio.wait_for(asyncio.gather(*(s.acquire() for _ in range(5))), 2)
+        assert s.counters["queued"] == 4 and s.counters["shed"] == 0
+
+    asyncio.run(run())
+
+
+def test_retry_after_is_capped():
+    s = scheduler.Scheduler(backoff_base=0.5, backoff_max=2)
+    assert s.backoff(0, httpx.Response(429, headers={"Retry-After": "3600"})) <= 2.5
+    assert 1 <= s.backoff(0, httpx.Response(429, headers={"Retry-After": "1"})) <= 1.5
+
+
+def test_long_retry_after_is_returned_instead_of_slept():
+    async def run():
+        s = scheduler.Scheduler(backoff_max=2, retries=3)
+        calls = []
+
+        async def send():
+            calls.append(1)
+            return httpx.Response(429, headers={"Retry-After": "3600"})
+
+        response = await asyncio.wait_for(s.request(send), 1)
+        assert response.status_code == 429 and len(calls) == 1
+        assert 0 < s.stats()["paused_for"] <= 2.5
+
+    asyncio.run(run())
+
+
+def test_retries_transient_errors():
+    async def run():
+        s = scheduler.Scheduler(backoff_base=0.01, retries=3)
+        statuses = iter([503, 502, 200])
+
+        async def send():
+            return httpx.Response(next(statuses))
+
+        assert (await s.request(send)).status_code == 200
+        assert s.counters["retries"] == 2
+
+    asyncio.run(run())
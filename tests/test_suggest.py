@@ -0,0 +1,59 @@
+import asyncio
+
+import suggest
+
+ENTRIES = [("Advil", "brand", 40), ("ADVIL", "generic", 10), ("Advil PM", "brand", 12), ("Adderall", "brand", 25),
+           ("adapalene", "generic", 25), ("Acetaminophen", "generic", 300), ("  ", "brand", 1), ("Zyrtec", "brand", 5)]
+
+
+def terms(results):
+    return [r["term"] for r in results]
+
+
+def test_merges_case_variants_keeping_the_commoner_display():
+    index = suggest.PrefixIndex(ENTRIES)
+    assert len(index) == 6
+    assert index.search("advil", 1) == [{"term": "Advil", "kinds": ["brand", "generic"], "count": 40}]
+
+
+def test_ranks_by_count_then_name():
+    index = suggest.PrefixIndex(ENTRIES)
+    assert terms(index.search("ad", 10)) == ["Advil", "adapalene", "Adderall", "Advil PM"]
+    assert terms(index.search("a", 2)) == ["Acetaminophen", "Advil"]
+    assert index.search("  ", 10) == [] and index.search("q", 10) == []
+
+
+def test_hot_prefixes_match_a_full_scan():
+    index = suggest.PrefixIndex(ENTRIES)
+    for prefix in ("a", "ad", "adv", "z"):
+        assert index.hot[prefix][:5] == index._top(prefix, 5)
+
+
+def test_long_prefixes_kinds_and_limits_bypass_the_hot_table():
+    index = suggest.PrefixIndex(ENTRIES)
+    index.hot.clear()
+    assert terms(index.search("advil p", 10)) == ["Advil PM"]
+    assert terms(index.search("ad", 10, {"generic"})) == ["Advil", "adapalene"]
+    assert index.search("ad", 10) == []  # served from the (emptied) hot table
+    assert len(index.search("a", suggest.HOT_LIMIT + 1)) == 5
+
+
+def test_suggester_snapshot_round_trip(tmp_path):
+    snapshot = str(tmp_path / "names.json")
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return ENTRIES
+
+    async def run():
+        first = suggest.Suggester(load, snapshot)
+        await first.rebuild()
+        second = suggest.Suggester(load, snapshot)
+        await second.rebuild()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert calls == [1]
+    assert (first.stats()["source"], second.stats()["source"]) == ("load", "snapshot")
+    assert second.search("adv") == first.search("adv")